@@ -0,0 +1,144 @@
+"""Functions for encrypting and decrypting binary data with a 258-card deck
+"""
+
+import sys
+from array import array
+from typing import List
+from typing import Union
+
+from cipher_deck import Deck
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A byte deck holds the cards 1 to 256, one per byte value, and two jokers.
+BYTE_DECK_SIZE = 258
+
+BYTES_LIKE = Union[bytes, bytearray, memoryview]
+
+# Maps the low byte of a keystream value from 1 to 256 to the value minus 1.
+_MINUS_ONE = bytes((value - 1) % 256 for value in range(256))
+
+
+def is_valid_byte_deck(deck: List[int]) -> bool:
+    """Return True if and only if deck holds each of the cards 1 to
+    BYTE_DECK_SIZE exactly once.
+
+    >>> is_valid_byte_deck(list(range(1, 259)))
+    True
+    >>> is_valid_byte_deck(list(range(1, 258)) + [1])
+    False
+    """
+
+    return sorted(deck) == list(range(1, BYTE_DECK_SIZE + 1))
+
+
+def take_byte_keystream(engine: Deck, count: int) -> bytes:
+    """Return the next count keystream values from engine, each one less
+    than the card it came from so that every value fits in a byte.
+
+    >>> engine = Deck(list(range(1, 259)))
+    >>> list(take_byte_keystream(engine, 5))
+    [248, 246, 253, 244, 234]
+
+    Precondition: engine holds a byte deck
+    """
+
+    values = array('H', bytes(2 * count))
+    engine.fill_keystream(values)
+    if sys.byteorder == 'little':
+        low_bytes = values.tobytes()[0::2]
+    else:
+        low_bytes = values.tobytes()[1::2]
+    return low_bytes.translate(_MINUS_ONE)
+
+
+def add_keystream(data: BYTES_LIKE, keystream: BYTES_LIKE) -> bytes:
+    """Return each byte of data plus the matching keystream byte, modulo 256.
+
+    >>> add_keystream(b'\\x01\\xff', b'\\x02\\x03')
+    b'\\x03\\x02'
+
+    Precondition: len(keystream) >= len(data)
+    """
+
+    count = len(data)
+    keystream = memoryview(keystream)[:count]
+    if numpy is not None:
+        return (numpy.frombuffer(data, dtype=numpy.uint8) +
+                numpy.frombuffer(keystream, dtype=numpy.uint8)).tobytes()
+    # Give each byte a 16-bit lane so that big integer addition can't carry
+    # from one byte into the next; the low byte of each lane is the result.
+    data_lanes = bytearray(2 * count)
+    data_lanes[1::2] = data
+    keystream_lanes = bytearray(2 * count)
+    keystream_lanes[1::2] = keystream
+    total = int.from_bytes(data_lanes, 'big') + \
+        int.from_bytes(keystream_lanes, 'big')
+    return total.to_bytes(2 * count, 'big')[1::2]
+
+
+def subtract_keystream(data: BYTES_LIKE, keystream: BYTES_LIKE) -> bytes:
+    """Return each byte of data minus the matching keystream byte, modulo
+    256.
+
+    >>> subtract_keystream(b'\\x03\\x02', b'\\x02\\x03')
+    b'\\x01\\xff'
+
+    Precondition: len(keystream) >= len(data)
+    """
+
+    count = len(data)
+    keystream = memoryview(keystream)[:count]
+    if numpy is not None:
+        return (numpy.frombuffer(data, dtype=numpy.uint8) -
+                numpy.frombuffer(keystream, dtype=numpy.uint8)).tobytes()
+    # Each data lane starts at 256 plus the byte, so subtracting a keystream
+    # byte never borrows from the next lane.
+    data_lanes = bytearray(b'\x01\x00' * count)
+    data_lanes[1::2] = data
+    keystream_lanes = bytearray(2 * count)
+    keystream_lanes[1::2] = keystream
+    difference = int.from_bytes(data_lanes, 'big') - \
+        int.from_bytes(keystream_lanes, 'big')
+    return difference.to_bytes(2 * count, 'big')[1::2]
+
+
+def encrypt_bytes(deck: List[int], data: BYTES_LIKE) -> bytes:
+    """Return data encrypted with keystream values generated using deck. deck
+    is moved on past every keystream value used, as in process_messages.
+
+    >>> deck = list(range(1, 259))
+    >>> encrypted = encrypt_bytes(deck, b'binary\\x00payload')
+    >>> decrypt_bytes(list(range(1, 259)), encrypted)
+    b'binary\\x00payload'
+
+    Precondition: deck is a valid byte deck, or a byte deck moved on by an
+    earlier call
+    """
+
+    engine = Deck(deck)
+    return add_keystream(data, take_byte_keystream(engine, len(data)))
+
+
+def decrypt_bytes(deck: List[int], data: BYTES_LIKE) -> bytes:
+    """Return data decrypted with keystream values generated using deck. deck
+    is moved on past every keystream value used, as in process_messages.
+
+    >>> deck = list(range(1, 259))
+    >>> decrypt_bytes(deck, encrypt_bytes(list(range(1, 259)), b'abc'))
+    b'abc'
+
+    Precondition: deck is a valid byte deck, or a byte deck moved on by an
+    earlier call
+    """
+
+    engine = Deck(deck)
+    return subtract_keystream(data, take_byte_keystream(engine, len(data)))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,257 @@
+"""An on-disk cache of keystream values keyed by the starting deck
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from cipher_deck import Deck
+
+CACHE_FILE_SUFFIX = '.keystream'
+
+# The smallest number of values generated whenever a cache file grows.
+MIN_EXTEND_COUNT = 4096
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# How many keystream values separate two deck snapshots in a new cache file.
+DEFAULT_INTERVAL = 1024
+
+# A cache file starts with the magic bytes, the deck size, the number of
+# cached values and the snapshot interval, then the deck state before every
+# interval-th value up to the cached count as unsigned shorts, then the
+# cached values themselves, one byte each.
+_MAGIC = b'KSC2'
+_HEADER = struct.Struct('<4sHQI')
+
+
+def deck_key(cards: List[int]) -> str:
+    """Return the cache key for a deck that starts out holding cards.
+
+    >>> deck_key([1, 2, 3]) == deck_key([1, 2, 3])
+    True
+    >>> deck_key([1, 2, 3]) == deck_key([3, 2, 1])
+    False
+    """
+
+    return hashlib.sha256(array('H', cards).tobytes()).hexdigest()[:32]
+
+
+class KeystreamCache:
+    """A directory of memory-mapped files holding the keystream produced by
+    each starting deck, along with the state of the deck every interval
+    values, so that the deck can be restored at any cached position.
+
+    A file grows when a longer prefix of its keystream is asked for, carrying
+    on from the last deck state saved with it. When the directory holds more
+    than max_bytes, the least recently used files are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 interval: int = DEFAULT_INTERVAL) -> None:
+        """Initialize a keystream cache that stores its files in directory,
+        saving the deck state every interval values in the files it creates.
+
+        >>> import tempfile
+        >>> cache = KeystreamCache(tempfile.mkdtemp())
+        >>> cache.max_bytes == DEFAULT_MAX_BYTES
+        True
+        >>> cache.close()
+
+        Precondition: interval > 0
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.interval = interval
+        # key -> (map of the file, offset of the first value, value count,
+        # deck size, snapshot interval), least recently used first.
+        self._maps = OrderedDict()
+
+    def get_keystream(self, cards: List[int], count: int) -> bytes:
+        """Return the first count keystream values produced by a deck that
+        starts out holding cards. cards is not changed.
+
+        >>> import tempfile
+        >>> cache = KeystreamCache(tempfile.mkdtemp())
+        >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+        >>> list(cache.get_keystream(cards, 6))
+        [19, 17, 24, 15, 5, 12]
+        >>> list(cache.get_keystream(cards, 3))
+        [19, 17, 24]
+        >>> cache.close()
+
+        Precondition: cards is a valid deck whose keystream values are less
+        than 256
+        """
+
+        keystream, start = self._entry(cards, count)[:2]
+        return keystream[start:start + count]
+
+    def get_deck(self, cards: List[int], position: int) -> Deck:
+        """Return a new deck in the state that a deck starting out holding
+        cards is in after producing position keystream values. cards is not
+        changed.
+
+        >>> import tempfile
+        >>> cache = KeystreamCache(tempfile.mkdtemp(), interval=4)
+        >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+        >>> list(cache.get_keystream(cards, 6))
+        [19, 17, 24, 15, 5, 12]
+        >>> deck = cache.get_deck(cards, 5)
+        >>> deck.next_keystream_value()
+        12
+        >>> deck.cards == cache.get_deck(cards, 6).cards
+        True
+        >>> cache.close()
+
+        Precondition: cards is a valid deck whose keystream values are less
+        than 256, position >= 0
+        """
+
+        keystream, _, _, size, interval = self._entry(cards, position)
+        snapshot, replay = divmod(position, interval)
+        start = _HEADER.size + 2 * size * snapshot
+        deck = Deck(array('H', keystream[start:start + 2 * size]).tolist())
+        if replay:
+            deck.fill_keystream(bytearray(replay))
+        return deck
+
+    def close(self) -> None:
+        """Close every memory-mapped cache file.
+
+        >>> import tempfile
+        >>> cache = KeystreamCache(tempfile.mkdtemp())
+        >>> _ = cache.get_keystream(list(range(1, 29)), 10)
+        >>> cache.close()
+        >>> len(cache._maps)
+        0
+        """
+
+        for entry in self._maps.values():
+            entry[0].close()
+        self._maps.clear()
+
+    def _path(self, key: str) -> str:
+        """Return the path of the cache file for key.
+        """
+
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def _entry(self, cards: List[int],
+               count: int) -> Tuple[mmap.mmap, int, int, int, int]:
+        """Return the entry for the deck that starts out holding cards,
+        growing its cache file first if it holds fewer than count values.
+        """
+
+        key = deck_key(cards)
+        entry = self._maps.get(key)
+        if entry is None:
+            entry = self._open(key)
+        if entry is None or entry[2] < count:
+            entry = self._extend(key, cards, count)
+        else:
+            self._maps.move_to_end(key)
+            os.utime(self._path(key))
+        return entry
+
+    def _open(self, key: str) -> Optional[
+            Tuple[mmap.mmap, int, int, int, int]]:
+        """Map the cache file for key into memory and return its entry, or
+        return None if there is no such file.
+        """
+
+        try:
+            with open(self._path(key), 'rb') as cache_file:
+                keystream = mmap.mmap(cache_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(keystream) < _HEADER.size:
+            keystream.close()
+            return None
+        magic, size, count, interval = _HEADER.unpack_from(keystream)
+        if magic != _MAGIC:
+            keystream.close()
+            return None
+        start = _HEADER.size + 2 * size * (count // interval + 1)
+        entry = (keystream, start, count, size, interval)
+        self._maps[key] = entry
+        return entry
+
+    def _extend(self, key: str, cards: List[int],
+                count: int) -> Tuple[mmap.mmap, int, int, int, int]:
+        """Rewrite the cache file for key so that it holds at least count
+        values, then map it into memory again and return its entry.
+        """
+
+        path = self._path(key)
+        entry = self._maps.pop(key, None)
+        if entry is None:
+            interval = self.interval
+            snapshots = array('H', cards)
+            values = bytearray()
+            cached = 0
+        else:
+            keystream, start, cached, size, interval = entry
+            snapshots = array('H', keystream[_HEADER.size:start])
+            # Carry on from the last snapshot, dropping the values after it.
+            values = bytearray(
+                keystream[start:start + cached - cached % interval])
+            keystream.close()
+        size = len(cards)
+        deck = Deck(snapshots[-size:].tolist())
+        target = max(count, 2 * cached, MIN_EXTEND_COUNT)
+        while len(values) < target:
+            produced = len(values)
+            values.extend(bytes(interval))
+            deck.fill_keystream(values, produced)
+            snapshots.extend(deck.cards)
+        del values[target:]
+        del snapshots[size * (target // interval + 1):]
+        # The file is written in full beside the old one and then moved over
+        # it, so an interrupted write leaves the old file as it was.
+        with open(path + '.tmp', 'wb') as cache_file:
+            cache_file.write(_HEADER.pack(_MAGIC, size, target, interval))
+            cache_file.write(snapshots.tobytes())
+            cache_file.write(values)
+        os.replace(path + '.tmp', path)
+        self._evict(keep=key)
+        return self._open(key)
+
+    def _evict(self, keep: str) -> None:
+        """Delete the least recently used cache files, other than the one for
+        keep, until the directory holds no more than max_bytes.
+        """
+
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_FILE_SUFFIX):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+                total += stat.st_size
+        files.sort()
+        for _, name, size in files:
+            if total <= self.max_bytes:
+                break
+            key = name[:-len(CACHE_FILE_SUFFIX)]
+            if key == keep:
+                continue
+            entry = self._maps.pop(key, None)
+            if entry is not None:
+                entry[0].close()
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,173 @@
+"""Deck snapshots for jumping to any position in a keystream
+"""
+
+import struct
+from typing import BinaryIO
+from typing import List
+
+from cipher_deck import Deck
+from cipher_functions import clean_message, process_cleaned_message
+
+# How many keystream values separate two snapshots by default.
+DEFAULT_INTERVAL = 1024
+
+# A saved index is the magic bytes, the deck size, the interval and the
+# number of snapshots, followed by the snapshots, one byte per card.
+_MAGIC = b'KSI1'
+_HEADER = struct.Struct('<4sHII')
+
+
+class KeystreamIndex:
+    """The state of a deck saved every interval keystream values, so that the
+    keystream can be resumed from any position by replaying fewer than
+    interval values.
+
+    Snapshots are recorded as positions past the last one are asked for.
+    Each snapshot takes one byte per card.
+    """
+
+    def __init__(self, cards: List[int],
+                 interval: int = DEFAULT_INTERVAL) -> None:
+        """Initialize an index of the keystream produced by a deck that starts
+        out holding cards. cards is not changed.
+
+        >>> index = KeystreamIndex(list(range(1, 29)), 100)
+        >>> index.snapshot_count
+        1
+
+        Precondition: cards is a valid deck of cards less than 256,
+        interval > 0
+        """
+
+        self.size = len(cards)
+        self.interval = interval
+        self._snapshots = bytearray(cards)
+        self._scratch = bytearray(interval)
+
+    @property
+    def snapshot_count(self) -> int:
+        """The number of snapshots recorded so far."""
+
+        return len(self._snapshots) // self.size
+
+    def seek(self, position: int) -> Deck:
+        """Return a new deck whose next keystream value is the value at
+        position in this keystream, counting from 0.
+
+        >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+        >>> index = KeystreamIndex(cards, 4)
+        >>> index.seek(5).next_keystream_value()
+        12
+        >>> index.snapshot_count
+        2
+
+        Precondition: position >= 0
+        """
+
+        snapshot, replay = divmod(position, self.interval)
+        if snapshot >= self.snapshot_count:
+            self._record(snapshot)
+        deck = self._restore(snapshot)
+        if replay:
+            deck.fill_keystream(self._scratch, 0, replay)
+        return deck
+
+    def get_keystream(self, position: int, count: int) -> bytearray:
+        """Return the count keystream values starting at position.
+
+        >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+        >>> index = KeystreamIndex(cards, 4)
+        >>> list(index.get_keystream(2, 4))
+        [24, 15, 5, 12]
+        >>> list(index.get_keystream(0, 2))
+        [19, 17]
+
+        Precondition: position >= 0, count >= 0
+        """
+
+        return self.seek(position).take_keystream(count)
+
+    def save(self, index_file: BinaryIO) -> None:
+        """Write this index to the binary file index_file.
+
+        >>> import io
+        >>> index = KeystreamIndex(list(range(1, 29)), 4)
+        >>> _ = index.seek(9)
+        >>> index_file = io.BytesIO()
+        >>> index.save(index_file)
+        >>> len(index_file.getvalue()) == _HEADER.size + 3 * 28
+        True
+        """
+
+        index_file.write(_HEADER.pack(_MAGIC, self.size, self.interval,
+                                      self.snapshot_count))
+        index_file.write(self._snapshots)
+
+    @classmethod
+    def load(cls, index_file: BinaryIO) -> 'KeystreamIndex':
+        """Return the index saved in the binary file index_file.
+
+        >>> import io
+        >>> index = KeystreamIndex(list(range(1, 29)), 4)
+        >>> _ = index.seek(9)
+        >>> index_file = io.BytesIO()
+        >>> index.save(index_file)
+        >>> _ = index_file.seek(0)
+        >>> loaded = KeystreamIndex.load(index_file)
+        >>> loaded.snapshot_count, loaded.get_keystream(2, 4) == index.get_keystream(2, 4)
+        (3, True)
+
+        Precondition: index_file holds an index written by save
+        """
+
+        magic, size, interval, count = _HEADER.unpack(
+            index_file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError('not a keystream index file')
+        index = cls.__new__(cls)
+        index.size = size
+        index.interval = interval
+        index._snapshots = bytearray(index_file.read(size * count))
+        index._scratch = bytearray(interval)
+        return index
+
+    def _restore(self, snapshot: int) -> Deck:
+        """Return a new deck in the state saved in snapshot number snapshot.
+        """
+
+        start = snapshot * self.size
+        return Deck(list(self._snapshots[start:start + self.size]))
+
+    def _record(self, snapshot: int) -> None:
+        """Record snapshots up to and including snapshot number snapshot.
+        """
+
+        deck = self._restore(self.snapshot_count - 1)
+        while self.snapshot_count <= snapshot:
+            deck.fill_keystream(self._scratch)
+            self._snapshots.extend(deck.cards)
+
+
+def process_message_at(index: KeystreamIndex, message: str, position: int,
+                       action: str) -> str:
+    """Return message modified according to action with the keystream values
+    starting at position in index.
+
+    >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+    >>> index = KeystreamIndex(cards, 2)
+    >>> process_message_at(index, 'S8*J R', 3, 'd')
+    'DEF'
+    >>> process_message_at(index, 'a7b%c', 0, 'e')
+    'TSA'
+
+    Precondition: action is either 'e' or 'd', position >= 0
+    """
+
+    cleaned_message = clean_message(message)
+    keystream = index.get_keystream(position, len(cleaned_message))
+    return process_cleaned_message(cleaned_message, keystream, action)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,97 @@
+"""Functions for measuring how long a deck runs before its state repeats
+"""
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from cipher_deck import Deck
+
+# The most keystream values generated for one deck before giving up.
+DEFAULT_MAX_STEPS = 10 ** 7
+
+
+def encode_state(deck: Deck) -> bytes:
+    """Return the state of deck as bytes, one byte per card.
+
+    >>> encode_state(Deck([3, 1, 2, 4, 5]))
+    b'\\x03\\x01\\x02\\x04\\x05'
+    """
+
+    return bytes(deck.cards)
+
+
+def find_cycle(cards: List[int],
+               max_steps: int = DEFAULT_MAX_STEPS) -> Optional[Tuple[int, int]]:
+    """Return (pre_period, period) for the keystream of a deck that starts
+    out holding cards, counted in keystream values, or None if the deck's
+    state does not repeat within max_steps values.
+
+    The deck is in the same state after pre_period values as after
+    pre_period + period values, and period is the smallest such gap. This
+    uses Brent's algorithm, so it needs only two decks of memory.
+
+    >>> find_cycle([1, 4, 7, 10, 13, 16, 19, 22, 25, 28, 3, 6, 9, 12, 15, 18, 21, 24, 27, 2, 5, 8, 11, 14, 17, 20, 23, 26])
+    (434, 28)
+    >>> find_cycle([1, 4, 7, 10, 13, 16, 19, 22, 25, 28, 3, 6, 9, 12, 15, 18, 21, 24, 27, 2, 5, 8, 11, 14, 17, 20, 23, 26], 400) is None
+    True
+
+    Precondition: cards is a valid deck of cards less than 256
+    """
+
+    scratch = bytearray(1)
+    tortoise = encode_state(Deck(cards))
+    hare = Deck(cards[:])
+    hare.fill_keystream(scratch)
+    steps = 1
+    power = period = 1
+    while encode_state(hare) != tortoise:
+        if steps >= max_steps:
+            return None
+        if power == period:
+            tortoise = encode_state(hare)
+            power *= 2
+            period = 0
+        hare.fill_keystream(scratch)
+        steps += 1
+        period += 1
+
+    tortoise = Deck(cards[:])
+    hare = Deck(cards[:])
+    hare.fill_keystream(bytearray(period))
+    pre_period = 0
+    while hare.cards != tortoise.cards:
+        tortoise.fill_keystream(scratch)
+        hare.fill_keystream(scratch)
+        pre_period += 1
+    return pre_period, period
+
+
+def find_cycles(decks: List[List[int]], max_steps: int = DEFAULT_MAX_STEPS,
+                executor: Optional[Executor] = None
+                ) -> List[Optional[Tuple[int, int]]]:
+    """Return find_cycle(cards, max_steps) for each cards in decks, in order,
+    running the decks on executor. If executor is None, a
+    ProcessPoolExecutor is created for the call.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     find_cycles([[1, 4, 7, 10, 13, 16, 19, 22, 25, 28, 3, 6, 9, 12, 15, 18, 21, 24, 27, 2, 5, 8, 11, 14, 17, 20, 23, 26], list(range(1, 29))], 10 ** 5, executor)
+    [(434, 28), (54, 51)]
+
+    Precondition: each deck in decks is a valid deck of cards less than 256
+    """
+
+    if executor is None:
+        with ProcessPoolExecutor() as own_executor:
+            return find_cycles(decks, max_steps, own_executor)
+    return list(executor.map(find_cycle, decks, repeat(max_steps),
+                             chunksize=max(1, len(decks) // 64)))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
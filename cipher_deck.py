@@ -0,0 +1,459 @@
+"""Indexed deck engine for generating Solitaire keystream values
+"""
+
+from heapq import nlargest
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import MutableSequence
+from typing import Optional
+
+# How many values keystream_values generates per bulk fill.
+KEYSTREAM_CHUNK_SIZE = 256
+
+
+class Deck:
+    """A deck of cards that produces Solitaire keystream values.
+
+    The jokers are the highest and second highest cards, as in
+    cipher_functions. The positions of both jokers are tracked as the cards
+    move, so no step has to search the deck for them. The card to position
+    table for the other cards is rebuilt only when index_of asks for it.
+
+    The cards list is mutated in place, so a Deck built around a caller's
+    list leaves that list in the same state the reference functions would.
+    That includes insert_top_to_bottom replacing a big joker on the bottom
+    with a copy of the small joker. From then on both copies are jokers and,
+    as with the reference functions, the one nearer the bottom moves first.
+    """
+
+    def __init__(self, cards: List[int]) -> None:
+        """Initialize a deck engine around cards.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> deck.big_joker, deck.small_joker
+        (28, 27)
+        >>> deck.big_index, deck.small_index
+        (27, 26)
+        >>> deck = Deck([27, 1, 2, 27])
+        >>> deck.big_index, deck.small_index
+        (0, 3)
+
+        cards that are not a list, such as a row of the decks load_key_decks
+        returns, are copied into a list of ints first, so that no step works
+        in an integer type that can wrap around.
+
+        >>> import array
+        >>> Deck(array.array('B', [1, 3, 2])).cards
+        [1, 3, 2]
+
+        Precondition: cards is a valid deck with at least two elements, or a
+        deck in which insert_top_to_bottom has replaced the big joker
+        """
+
+        if not isinstance(cards, list):
+            cards = [int(card) for card in cards]
+        self.cards = cards
+        self.size = len(cards)
+        self.big_joker, self.small_joker = nlargest(2, cards)
+        self.big_index = cards.index(self.big_joker)
+        if self.big_joker == self.small_joker:
+            self.small_index = cards.index(self.small_joker,
+                                           self.big_index + 1)
+        else:
+            self.small_index = cards.index(self.small_joker)
+        self._positions = None
+
+    def copy(self) -> 'Deck':
+        """Return a new deck engine over a copy of this deck's cards.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> other = deck.copy()
+        >>> other.move_small_joker()
+        >>> deck.small_index, other.small_index
+        (26, 25)
+        """
+
+        other = Deck.__new__(Deck)
+        other.cards = self.cards[:]
+        other.size = self.size
+        other.big_joker = self.big_joker
+        other.small_joker = self.small_joker
+        other.big_index = self.big_index
+        other.small_index = self.small_index
+        other._positions = None
+        return other
+
+    def reset(self, cards: List[int]) -> None:
+        """Make this deck engine work on cards instead of its current cards.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> deck.reset([28, 27, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26])
+        >>> deck.big_index, deck.small_index
+        (0, 1)
+
+        Precondition: cards is a deck that Deck(cards) accepts
+        """
+
+        self.__init__(cards)
+
+    def index_of(self, card: int) -> int:
+        """Return the index of card in this deck.
+
+        >>> deck = Deck([28, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 1])
+        >>> deck.index_of(28)
+        0
+        >>> deck.index_of(1)
+        27
+
+        Precondition: card appears once in this deck
+        """
+
+        if card == self.big_joker:
+            return self.big_index
+        if card == self.small_joker:
+            return self.small_index
+        if self._positions is None:
+            self._positions = _build_positions(self.cards)
+        return self._positions[card]
+
+    def move_small_joker(self) -> None:
+        """Swap the small joker with the card directly before it.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> deck.move_small_joker()
+        >>> deck.cards
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 27, 26, 28]
+        >>> deck.small_index
+        25
+        """
+
+        if self.big_joker == self.small_joker and \
+           self.big_index > self.small_index:
+            self._swap_big_joker()
+        else:
+            self._swap_small_joker()
+        self._positions = None
+
+    def move_big_joker(self) -> None:
+        """Swap the big joker twice, each time with the card before it.
+
+        >>> deck = Deck([28, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 1])
+        >>> deck.move_big_joker()
+        >>> deck.cards
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 28, 27]
+        >>> deck.big_index, deck.small_index
+        (26, 27)
+        """
+
+        for _ in range(2):
+            if self.big_joker == self.small_joker and \
+               self.small_index > self.big_index:
+                self._swap_small_joker()
+            else:
+                self._swap_big_joker()
+        self._positions = None
+
+    def _swap_small_joker(self) -> None:
+        """Swap the card at small_index with the card before it, wrapping
+        around to the bottom card.
+
+        >>> deck = Deck([27, 1, 2, 28])
+        >>> deck._swap_small_joker()
+        >>> deck.cards, deck.small_index, deck.big_index
+        ([28, 1, 2, 27], 3, 0)
+        """
+
+        cards = self.cards
+        index = self.small_index
+        previous = index - 1 if index else self.size - 1
+        cards[index], cards[previous] = cards[previous], cards[index]
+        if previous == self.big_index:
+            self.big_index = index
+        self.small_index = previous
+
+    def _swap_big_joker(self) -> None:
+        """Swap the card at big_index with the card before it, wrapping
+        around to the bottom card.
+
+        >>> deck = Deck([1, 28, 27, 2])
+        >>> deck._swap_big_joker()
+        >>> deck.cards, deck.small_index, deck.big_index
+        ([28, 1, 27, 2], 2, 0)
+        """
+
+        cards = self.cards
+        index = self.big_index
+        previous = index - 1 if index else self.size - 1
+        cards[index], cards[previous] = cards[previous], cards[index]
+        if previous == self.small_index:
+            self.small_index = index
+        self.big_index = previous
+
+    def triple_cut(self) -> None:
+        """Swap the cards above the first joker with the cards below the
+        second joker.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 27, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 28, 25, 26])
+        >>> deck.triple_cut()
+        >>> deck.cards
+        [25, 26, 27, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 28, 1, 2, 3, 4, 5, 6, 7]
+        >>> deck.small_index, deck.big_index
+        (2, 20)
+        """
+
+        cards = self.cards
+        first, second = sorted((self.small_index, self.big_index))
+        cards[:] = cards[second + 1:] + cards[first:second + 1] + cards[:first]
+        # Both jokers sit in the middle section, which moves as one block.
+        shift = self.size - 1 - first - second
+        self.small_index += shift
+        self.big_index += shift
+        self._positions = None
+
+    def insert_top_to_bottom(self) -> None:
+        """Move as many cards as the value of the bottom card from the top of
+        the deck to just above the bottom card. A big joker on the bottom is
+        replaced by a copy of the small joker, as the reference function does.
+
+        >>> deck = Deck([25, 26, 27, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 28, 1, 2, 3, 4, 5, 6, 7])
+        >>> deck.insert_top_to_bottom()
+        >>> deck.cards
+        [12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 28, 1, 2, 3, 4, 5, 6, 25, 26, 27, 8, 9, 10, 11, 7]
+        >>> deck.small_index, deck.big_index
+        (22, 13)
+        """
+
+        cards = self.cards
+        last_card = cards[-1]
+        if last_card == self.big_joker:
+            last_card = self.small_joker
+            cards[-1] = last_card
+            self.big_joker = last_card
+        cards[:-1] = cards[last_card:-1] + cards[:last_card]
+        # Every card above the bottom one rotates up by last_card places.
+        rotation = self.size - 1
+        if self.small_index != rotation:
+            self.small_index = (self.small_index - last_card) % rotation
+        if self.big_index != rotation:
+            self.big_index = (self.big_index - last_card) % rotation
+        self._positions = None
+
+    def get_card_at_top_index(self) -> int:
+        """Return the card at the index given by the value of the top card.
+        The big joker counts as the small joker's value.
+
+        >>> deck = Deck([25, 26, 27, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 28, 1, 2, 3, 4, 5, 6, 7])
+        >>> deck.get_card_at_top_index()
+        5
+        >>> deck = Deck([28, 26, 27, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 1, 2, 3, 4, 5, 6, 7])
+        >>> deck.get_card_at_top_index()
+        7
+        """
+
+        cards = self.cards
+        top_card = cards[0]
+        if top_card == self.big_joker:
+            top_card = self.small_joker
+        return cards[top_card]
+
+    def next_keystream_value(self) -> int:
+        """Return the next keystream value, repeating the Solitaire steps until
+        the card they select is not a joker.
+
+        >>> deck = Deck([1, 4, 7, 10, 13, 16, 19, 22, 25, 28, 3, 6, 9, 12, 15, 18, 21, 24, 27, 2, 5, 8, 11, 14, 17, 20, 23, 26])
+        >>> deck.next_keystream_value()
+        3
+        >>> deck = Deck([23, 26, 28, 9, 12, 15, 18, 21, 24, 2, 27, 1, 4, 7, 10, 13, 16, 19, 22, 25, 3, 5, 8, 11, 14, 17, 20, 6])
+        >>> deck.next_keystream_value()
+        4
+        """
+
+        big_joker = self.big_joker
+        small_joker = self.small_joker
+        keystream = big_joker
+        while keystream == big_joker or keystream == small_joker:
+            self.move_small_joker()
+            self.move_big_joker()
+            self.triple_cut()
+            self.insert_top_to_bottom()
+            keystream = self.get_card_at_top_index()
+        return keystream
+
+    def keystream(self) -> Iterator[int]:
+        """Yield keystream values from this deck, advancing it by exactly one
+        value each time a value is taken.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> values = deck.keystream()
+        >>> next(values), next(values), next(values)
+        (19, 17, 24)
+        """
+
+        next_value = self.next_keystream_value
+        while True:
+            yield next_value()
+
+    def fill_keystream(self, buffer: MutableSequence[int], start: int = 0,
+                       stop: Optional[int] = None) -> None:
+        """Store the next keystream values from this deck in buffer[start:stop],
+        one value per slot. buffer may be a bytearray, an array or a list.
+
+        This does the same work as calling next_keystream_value once per slot,
+        with every step inlined so that no method is called per value.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> buffer = bytearray(6)
+        >>> deck.fill_keystream(buffer, 0, 3)
+        >>> deck.fill_keystream(buffer, 3)
+        >>> list(buffer)
+        [19, 17, 24, 15, 5, 12]
+
+        Precondition: every value fits in buffer, and 0 <= start <= stop <=
+        len(buffer)
+        """
+
+        if stop is None:
+            stop = len(buffer)
+        cards = self.cards
+        last = self.size - 1
+        big_joker = self.big_joker
+        small_joker = self.small_joker
+        big_index = self.big_index
+        small_index = self.small_index
+        for position in range(start, stop):
+            big_value = big_joker
+            small_value = small_joker
+            keystream = big_value
+            while keystream == big_value or keystream == small_value:
+                # move_small_joker
+                if big_joker == small_joker and big_index > small_index:
+                    previous = big_index - 1
+                    cards[big_index], cards[previous] = \
+                        cards[previous], cards[big_index]
+                    if previous == small_index:
+                        small_index = big_index
+                    big_index = previous
+                else:
+                    previous = small_index - 1 if small_index else last
+                    cards[small_index], cards[previous] = \
+                        cards[previous], cards[small_index]
+                    if previous == big_index:
+                        big_index = small_index
+                    small_index = previous
+                # move_big_joker
+                for _ in range(2):
+                    if big_joker == small_joker and small_index > big_index:
+                        previous = small_index - 1
+                        cards[small_index], cards[previous] = \
+                            cards[previous], cards[small_index]
+                        if previous == big_index:
+                            big_index = small_index
+                        small_index = previous
+                    else:
+                        previous = big_index - 1 if big_index else last
+                        cards[big_index], cards[previous] = \
+                            cards[previous], cards[big_index]
+                        if previous == small_index:
+                            small_index = big_index
+                        big_index = previous
+                # triple_cut
+                if small_index < big_index:
+                    first, second = small_index, big_index
+                else:
+                    first, second = big_index, small_index
+                cards[:] = \
+                    cards[second + 1:] + cards[first:second + 1] + cards[:first]
+                shift = last - first - second
+                small_index += shift
+                big_index += shift
+                # insert_top_to_bottom
+                last_card = cards[last]
+                if last_card == big_joker:
+                    last_card = small_joker
+                    cards[last] = last_card
+                    big_joker = last_card
+                cards[:last] = cards[last_card:last] + cards[:last_card]
+                if small_index != last:
+                    small_index = (small_index - last_card) % last
+                if big_index != last:
+                    big_index = (big_index - last_card) % last
+                # get_card_at_top_index
+                top_card = cards[0]
+                if top_card == big_joker:
+                    top_card = small_joker
+                keystream = cards[top_card]
+            buffer[position] = keystream
+        self.big_joker = big_joker
+        self.big_index = big_index
+        self.small_index = small_index
+        self._positions = None
+
+    def take_keystream(self, count: int) -> bytearray:
+        """Return a bytearray of the next count keystream values from this
+        deck.
+
+        >>> deck = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+        >>> list(deck.take_keystream(4))
+        [19, 17, 24, 15]
+        >>> list(deck.take_keystream(2))
+        [5, 12]
+
+        Precondition: every keystream value of this deck is less than 256
+        """
+
+        buffer = bytearray(count)
+        self.fill_keystream(buffer)
+        return buffer
+
+
+def keystream_values(cards: List[int]) -> Iterator[int]:
+    """Yield the keystream values produced by a deck holding cards, without
+    changing cards. Values are generated KEYSTREAM_CHUNK_SIZE at a time.
+
+    >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+    >>> values = keystream_values(cards)
+    >>> [next(values) for _ in range(6)]
+    [19, 17, 24, 15, 5, 12]
+    >>> cards[:3]
+    [1, 2, 3]
+
+    Precondition: cards is a valid deck with at least two elements
+    """
+
+    deck = Deck(cards[:])
+    buffer = [0] * KEYSTREAM_CHUNK_SIZE
+    while True:
+        deck.fill_keystream(buffer)
+        yield from buffer
+
+
+def precompute_keystream(cards: List[int], count: int) -> bytearray:
+    """Return a bytearray of the first count keystream values produced by a
+    deck holding cards, without changing cards.
+
+    >>> cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+    >>> list(precompute_keystream(cards, 6))
+    [19, 17, 24, 15, 5, 12]
+    >>> cards[:3]
+    [1, 2, 3]
+
+    Precondition: cards is a valid deck with keystream values less than 256
+    """
+
+    return Deck(cards[:]).take_keystream(count)
+
+
+def _build_positions(cards: List[int]) -> Dict[int, int]:
+    """Return a dictionary from each card in cards to its index.
+
+    >>> _build_positions([3, 1, 2])
+    {3: 0, 1: 1, 2: 2}
+    """
+
+    return dict(zip(cards, range(len(cards))))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,10 +1,19 @@
 """CSC108 Assignment 2 functions"""  
   
 from typing import List  
+from typing import Optional
+
+from cipher_cache import KeystreamCache
+from cipher_deck import Deck
+from cipher_transform import encrypt_message, decrypt_message
+from text_normalize import normalize_message, normalize_messages
   
   
 ENCRYPT = 'e'  
 DECRYPT = 'd'  
+
+# The cards every valid deck must hold.
+_ALL_CARDS = frozenset(range(1, 29))
   
   
 def clean_message(message: str) -> str:  
@@ -21,12 +30,7 @@ def clean_message(message: str) -> str:
     Precondition: message cannot be None 
     """  
       
-    edited_message = ""  
-    for char in message:  
-        if char.isalpha():  
-            char = char.upper()  
-            edited_message += char  
-    return edited_message  
+    return normalize_message(message)
   
   
 def encrypt_letter(letter: str, keystream_value: int) -> str:  
@@ -84,10 +88,7 @@ def is_valid_deck(deck: List[int]) -> bool:
     Precondition: The size of the deck is always 28   
     """  
       
-    for i in range(1, 29):  
-        if not i in deck:  
-            return False  
-    return True  
+    return _ALL_CARDS.issubset(deck)
       
       
 def swap_cards(deck: List[int], index: int) -> None:  
@@ -349,7 +350,8 @@ def get_next_keystream_value(deck: List[int]) -> int:
     return keystream  
   
   
-def process_messages(deck: List[int], messages: List[str], action: str) -> None:  
+def process_messages(deck: List[int], messages: List[str], action: str,
+                     cache: Optional[KeystreamCache] = None) -> None:  
     """Return a list of messages representing the messages modified according to  
     action with keystream_values generated using deck. 
      
@@ -357,25 +359,66 @@ def process_messages(deck: List[int], messages: List[str], action: str) -> None:
     ['TSA', 'SJR']
     >>> process_messages([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], ['T S6%A','S8*J R'], 'd')
     ['ABC', 'DEF']
+    >>> import tempfile
+    >>> cache = KeystreamCache(tempfile.mkdtemp())
+    >>> process_messages([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], ['T S6%A','S8*J R'], 'd', cache)
+    ['ABC', 'DEF']
+    >>> deck = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]
+    >>> process_messages(deck, ['aaaa'], 'e', cache), process_messages(deck, ['aaaa'], 'e', cache)
+    (['TRYP'], ['FMAI'])
+    >>> cache.close()
+     
+    deck is moved on past every keystream value used. If cache is given, the 
+    keystream values and the deck's new state are read from it. 
      
     Precondition: the deck is a valid deck with at least two elements,  
     action is either 'e' or 'd' 
     """  
       
+    cleaned_messages = normalize_messages(messages)
+    total_length = sum(map(len, cleaned_messages))
+    if cache is None:
+        keystream = Deck(deck).take_keystream(total_length)
+    else:
+        keystream = cache.get_keystream(deck, total_length)
+        deck[:] = cache.get_deck(deck, total_length).cards
+    keystream = memoryview(keystream)
     result = []  
-    for message in messages:  
-        new_message = ""  
-        cleaned_message = clean_message(message)  
-        for letter in cleaned_message:  
-            keystream = get_next_keystream_value(deck)  
-            if action == ENCRYPT:  
-                new_message = new_message + encrypt_letter(letter, keystream)  
-            else:  
-                new_message = new_message + decrypt_letter(letter, keystream)  
-        result.extend([new_message])  
+    offset = 0
+    for cleaned_message in cleaned_messages:  
+        message_keystream = keystream[offset:offset + len(cleaned_message)]
+        offset += len(cleaned_message)
+        result.extend([process_cleaned_message(cleaned_message,
+                                               message_keystream, action)])
     return result  
       
       
+def process_cleaned_message(cleaned_message: str, keystream: bytes,
+                            action: str) -> str:
+    """Return cleaned_message modified according to action with one value
+    from keystream per letter.
+
+    >>> process_cleaned_message('ABC', bytes([19, 17, 24]), 'e')
+    'TSA'
+    >>> process_cleaned_message('TSA', bytes([19, 17, 24]), 'd')
+    'ABC'
+
+    Precondition: cleaned_message was returned by clean_message, keystream
+    holds at least len(cleaned_message) values, action is either 'e' or 'd'
+    """
+
+    if not cleaned_message.isascii():
+        # Letters outside A-Z can't go through the byte tables.
+        if action == ENCRYPT:
+            letter_function = encrypt_letter
+        else:
+            letter_function = decrypt_letter
+        return "".join(map(letter_function, cleaned_message, keystream))
+    if action == ENCRYPT:
+        return encrypt_message(cleaned_message, keystream)
+    return decrypt_message(cleaned_message, keystream)
+      
+      
 if __name__ == '__main__':  
     """Did you know that you can get Python to automatically run and check 
     your docstring examples? These examples are called "doctests". 
@@ -0,0 +1,138 @@
+"""Functions for storing and loading many key decks at once
+"""
+
+import mmap
+import struct
+from typing import BinaryIO
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A key deck file is the magic bytes, the deck size and the number of decks,
+# followed by the decks one after another, one byte per card.
+_MAGIC = b'KDK1'
+_HEADER = struct.Struct('<4sHI')
+
+
+def write_key_decks(key_file: BinaryIO, decks: Iterable[List[int]],
+                    size: int = 28) -> int:
+    """Write decks of size cards each to the binary file key_file and return
+    the number of decks written.
+
+    >>> import io
+    >>> key_file = io.BytesIO()
+    >>> write_key_decks(key_file, [[2, 1, 3], [3, 1, 2]], 3)
+    2
+    >>> key_file.getvalue()[_HEADER.size:]
+    b'\\x02\\x01\\x03\\x03\\x01\\x02'
+
+    Precondition: every deck has size cards, each less than 256
+    """
+
+    body = bytearray()
+    for deck in decks:
+        body.extend(deck)
+    count = len(body) // size
+    key_file.write(_HEADER.pack(_MAGIC, size, count))
+    key_file.write(body)
+    return count
+
+
+def load_key_decks(path: str) -> Tuple[object, List[int]]:
+    """Return (decks, invalid_rows) for the key deck file at path.
+
+    The file is memory-mapped rather than read. decks has one row per deck:
+    a read-only NumPy array of unsigned bytes of shape (count, size) when
+    NumPy is available, and a two-dimensional memoryview otherwise, or an
+    empty one-dimensional memoryview if the file holds no decks.
+    invalid_rows lists, in order, the rows that are not a permutation of 1
+    to size. get_key_deck gives a row as a list of ints for a Deck.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'keys.bin')
+    >>> with open(path, 'wb') as key_file:
+    ...     write_key_decks(key_file, [[2, 1, 3], [3, 3, 2], [1, 2, 3]], 3)
+    3
+    >>> decks, invalid_rows = load_key_decks(path)
+    >>> invalid_rows
+    [1]
+    >>> decks.tolist()[2]
+    [1, 2, 3]
+    >>> with open(path, 'wb') as key_file:
+    ...     write_key_decks(key_file, [], 3)
+    0
+    >>> decks, invalid_rows = load_key_decks(path)
+    >>> len(decks), invalid_rows
+    (0, [])
+
+    Precondition: path names a file written by write_key_decks
+    """
+
+    with open(path, 'rb') as key_file:
+        mapped = mmap.mmap(key_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, size, count = _HEADER.unpack_from(mapped)
+    if magic != _MAGIC:
+        mapped.close()
+        raise ValueError('not a key deck file: ' + path)
+    if numpy is not None:
+        decks = numpy.frombuffer(mapped, dtype=numpy.uint8, count=count * size,
+                                 offset=_HEADER.size).reshape(count, size)
+    else:
+        decks = memoryview(mapped)[_HEADER.size:_HEADER.size + count * size]
+        if not count:
+            # A memoryview cannot have a shape with a zero in it.
+            return decks, []
+        decks = decks.cast('B', (count, size))
+    return decks, find_invalid_decks(decks)
+
+
+def get_key_deck(decks: object, row: int) -> List[int]:
+    """Return row row of decks, as returned by load_key_decks, as a new list
+    of ints.
+
+    >>> get_key_deck(memoryview(bytes([2, 1, 3, 3, 1, 2])).cast('B', (2, 3)), 1)
+    [3, 1, 2]
+    >>> from cipher_deck import Deck
+    >>> decks = memoryview(bytes(range(1, 29))).cast('B', (1, 28))
+    >>> Deck(get_key_deck(decks, 0)).take_keystream(6)
+    bytearray(b'\\x13\\x11\\x18\\x0f\\x05\\x0c')
+
+    Precondition: 0 <= row < the number of rows in decks
+    """
+
+    if numpy is not None and isinstance(decks, numpy.ndarray):
+        return decks[row].tolist()
+    size = decks.shape[1]
+    return list(decks.cast('B')[row * size:(row + 1) * size])
+
+
+def find_invalid_decks(decks: object) -> List[int]:
+    """Return the indexes of the rows of decks that are not a permutation of
+    1 to the number of columns, checking every row in one pass.
+
+    >>> find_invalid_decks(memoryview(bytes([1, 2, 2, 1, 3, 3])).cast('B', (3, 2)))
+    [2]
+
+    Precondition: decks is a two-dimensional NumPy array or memoryview of
+    unsigned bytes
+    """
+
+    count, size = decks.shape
+    if numpy is not None and isinstance(decks, numpy.ndarray):
+        expected = numpy.arange(1, size + 1, dtype=decks.dtype)
+        valid = (numpy.sort(decks, axis=1) == expected).all(axis=1)
+        return numpy.flatnonzero(~valid).tolist()
+    expected = bytes(range(1, size + 1))
+    rows = decks.tobytes()
+    return [row for row in range(count)
+            if bytes(sorted(rows[row * size:(row + 1) * size])) != expected]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
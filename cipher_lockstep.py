@@ -0,0 +1,240 @@
+"""A keystream engine that moves many decks through Solitaire in lockstep
+"""
+
+from array import array
+from typing import List
+
+from cipher_deck import Deck
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class DeckBatch:
+    """Many independent decks of the same size that produce keystream values
+    together.
+
+    With NumPy, the decks are held as one (deck count, deck size) array and
+    each Solitaire step is applied to every deck at once, driven by arrays
+    of per-deck joker values and positions. Without NumPy, each deck is run
+    by its own Deck engine. Either way each deck produces exactly the values
+    that Deck would.
+    """
+
+    def __init__(self, decks: List[List[int]]) -> None:
+        """Initialize a batch engine over copies of decks.
+
+        >>> batch = DeckBatch([[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28]] * 3)
+        >>> batch.count, batch.size
+        (3, 28)
+
+        Precondition: decks is not empty and every deck in it is a valid deck
+        of the same size
+        """
+
+        decks = [list(deck) for deck in decks]
+        self.count = len(decks)
+        self.size = len(decks[0])
+        self._value_format = 'B' if max(map(max, decks)) < 256 else 'H'
+        if numpy is None:
+            self._decks = [Deck(deck) for deck in decks]
+            return
+        self.cards = numpy.array(decks, dtype=numpy.int32)
+        engines = [Deck(deck) for deck in decks]
+        self.big_jokers = numpy.array([engine.big_joker for engine in engines])
+        self.small_jokers = numpy.array(
+            [engine.small_joker for engine in engines])
+        self.big_indexes = numpy.array(
+            [engine.big_index for engine in engines])
+        self.small_indexes = numpy.array(
+            [engine.small_index for engine in engines])
+
+    def take_keystream(self, length: int) -> object:
+        """Return a (deck count, length) matrix of the next length keystream
+        values of each deck: a NumPy array when NumPy is available and a
+        two-dimensional memoryview otherwise.
+
+        >>> batch = DeckBatch([[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], [1, 4, 7, 10, 13, 16, 19, 22, 25, 28, 3, 6, 9, 12, 15, 18, 21, 24, 27, 2, 5, 8, 11, 14, 17, 20, 23, 26]])
+        >>> batch.take_keystream(4).tolist()
+        [[19, 17, 24, 15], [3, 11, 8, 17]]
+        >>> batch.take_keystream(2).tolist()
+        [[5, 12], [4, 23]]
+
+        Precondition: length >= 0
+        """
+
+        if numpy is None:
+            values = array(self._value_format)
+            row = array(self._value_format, bytes(
+                length * values.itemsize))
+            for engine in self._decks:
+                engine.fill_keystream(row)
+                values.extend(row)
+            return memoryview(values).cast('B').cast(
+                self._value_format, (self.count, length))
+        dtype = numpy.uint8 if self._value_format == 'B' else numpy.uint16
+        values = numpy.empty((self.count, length), dtype=dtype)
+        for column in range(length):
+            values[:, column] = self._next_values()
+        return values
+
+    def _next_values(self) -> 'numpy.ndarray':
+        """Return the next keystream value of every deck.
+        """
+
+        values = numpy.zeros(self.count, dtype=numpy.int32)
+        rows = numpy.arange(self.count)
+        while rows.size:
+            found = self._run_round(rows)
+            done = (found != self.big_jokers[rows]) & \
+                (found != self.small_jokers[rows])
+            values[rows[done]] = found[done]
+            rows = rows[~done]
+        return values
+
+    def _run_round(self, rows: 'numpy.ndarray') -> 'numpy.ndarray':
+        """Apply one round of the four Solitaire steps to the decks in rows
+        and return the card each of them then selects.
+        """
+
+        size = self.size
+        last = size - 1
+        cards = self.cards[rows]
+        big_joker = self.big_jokers[rows]
+        small_joker = self.small_jokers[rows]
+        big_index = self.big_indexes[rows]
+        small_index = self.small_indexes[rows]
+        row_numbers = numpy.arange(rows.size)
+        # Once the big joker has been replaced, both jokers have the same
+        # value and the one nearer the bottom moves first.
+        merged = big_joker == small_joker
+
+        # move_small_joker
+        moves_big = merged & (big_index > small_index)
+        small_index, big_index = _swap_back_where(
+            cards, row_numbers, ~moves_big, small_index, big_index)
+        # move_big_joker
+        for _ in range(2):
+            moves_small = merged & (small_index > big_index)
+            small_index, big_index = _swap_back_where(
+                cards, row_numbers, moves_small, small_index, big_index)
+
+        # triple_cut
+        first = numpy.minimum(small_index, big_index)
+        second = numpy.maximum(small_index, big_index)
+        offsets = (row_numbers * size)[:, None]
+        cards = cards.ravel().take(
+            _triple_cut_sources(first, second, size) + offsets).reshape(
+                rows.size, size)
+        shift = last - first - second
+        small_index = small_index + shift
+        big_index = big_index + shift
+
+        # insert_top_to_bottom
+        last_card = cards[:, last]
+        replaced = last_card == big_joker
+        last_card = numpy.where(replaced, small_joker, last_card)
+        cards[:, last] = last_card
+        big_joker = numpy.where(replaced, small_joker, big_joker)
+        cards = cards.ravel().take(
+            _insert_sources(size)[last_card] + offsets).reshape(
+                rows.size, size)
+        small_index = numpy.where(small_index == last, last,
+                                  (small_index - last_card) % last)
+        big_index = numpy.where(big_index == last, last,
+                                (big_index - last_card) % last)
+
+        # get_card_at_top_index
+        top_card = cards[:, 0]
+        top_card = numpy.where(top_card == big_joker, small_joker, top_card)
+        found = cards[row_numbers, top_card]
+
+        self.cards[rows] = cards
+        self.big_jokers[rows] = big_joker
+        self.big_indexes[rows] = big_index
+        self.small_indexes[rows] = small_index
+        return found
+
+
+# The largest deck size whose triple cut sources are all precomputed.
+_MAX_TABLE_SIZE = 64
+
+# Deck size -> precomputed source index tables.
+_TRIPLE_CUT_TABLES = {}
+_INSERT_TABLES = {}
+
+
+def _triple_cut_sources(first: 'numpy.ndarray', second: 'numpy.ndarray',
+                        size: int) -> 'numpy.ndarray':
+    """Return, for each row, the old position of the card that a triple cut
+    around positions first and second moves to each new position.
+    """
+
+    if size <= _MAX_TABLE_SIZE:
+        table = _TRIPLE_CUT_TABLES.get(size)
+        if table is None:
+            grid = numpy.arange(size)
+            table = _build_triple_cut_sources(grid[:, None, None],
+                                              grid[None, :, None], size)
+            _TRIPLE_CUT_TABLES[size] = table
+        return table[first, second]
+    return _build_triple_cut_sources(first[:, None], second[:, None], size)
+
+
+def _build_triple_cut_sources(first: 'numpy.ndarray', second: 'numpy.ndarray',
+                              size: int) -> 'numpy.ndarray':
+    """Return the triple cut sources for first and second, which broadcast
+    against the new positions along their last axis.
+    """
+
+    position = numpy.arange(size)
+    bottom_length = size - 1 - second
+    top_end = bottom_length + second - first + 1
+    return numpy.where(
+        position < bottom_length, second + 1 + position,
+        numpy.where(position < top_end, first + position - bottom_length,
+                    position - top_end))
+
+
+def _insert_sources(size: int) -> 'numpy.ndarray':
+    """Return a table whose row n gives, for each new position, the old
+    position of the card that moving n cards from the top to just above the
+    bottom card puts there.
+    """
+
+    table = _INSERT_TABLES.get(size)
+    if table is None:
+        last = size - 1
+        position = numpy.arange(size)[None, :]
+        count = numpy.arange(size)[:, None]
+        table = numpy.where(position < last, (position + count) % last, last)
+        _INSERT_TABLES[size] = table
+    return table
+
+
+def _swap_back_where(cards: 'numpy.ndarray', row_numbers: 'numpy.ndarray',
+                     move_small: 'numpy.ndarray',
+                     small_index: 'numpy.ndarray',
+                     big_index: 'numpy.ndarray') -> tuple:
+    """Swap one joker of each row of cards with the card before it, wrapping
+    around to the bottom: the small joker where move_small is True and the
+    big joker elsewhere. Return the new (small_index, big_index).
+    """
+
+    moving = numpy.where(move_small, small_index, big_index)
+    other = numpy.where(move_small, big_index, small_index)
+    previous = numpy.where(moving == 0, cards.shape[1] - 1, moving - 1)
+    moving_cards = cards[row_numbers, moving]
+    cards[row_numbers, moving] = cards[row_numbers, previous]
+    cards[row_numbers, previous] = moving_cards
+    other = numpy.where(previous == other, moving, other)
+    moving = previous
+    return (numpy.where(move_small, moving, other),
+            numpy.where(move_small, other, moving))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,95 @@
+"""Functions for processing large batches of messages on several cores
+"""
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from typing import List
+from typing import Optional
+
+from cipher_deck import Deck
+from cipher_functions import process_cleaned_message
+from text_normalize import normalize_messages
+
+# How many messages each worker task handles.
+DEFAULT_CHUNK_SIZE = 256
+
+
+def process_messages_parallel(deck: List[int], messages: List[str],
+                              action: str,
+                              executor: Optional[Executor] = None,
+                              chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+    """Return the same list of messages as process_messages(deck, messages,
+    action), cleaning and transforming the messages on executor.
+
+    The messages are cleaned in parallel first. Their cleaned lengths give
+    each message's offset into the keystream, which is then generated once,
+    in order, from deck. Each chunk of messages is sent to a worker with its
+    own slice of that keystream. If executor is None, a ProcessPoolExecutor
+    is created for the call.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     process_messages_parallel([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], ["a7b%c", "d7e*f "], 'e', executor, 1)
+    ['TSA', 'SJR']
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     process_messages_parallel([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], ['T S6%A', 'S8*J R'], 'd', executor, 1)
+    ['ABC', 'DEF']
+
+    Precondition: the deck is a valid deck with at least two elements,
+    action is either 'e' or 'd', chunk_size > 0
+    """
+
+    if executor is None:
+        with ProcessPoolExecutor() as own_executor:
+            return process_messages_parallel(deck, messages, action,
+                                             own_executor, chunk_size)
+
+    chunks = [messages[i:i + chunk_size]
+              for i in range(0, len(messages), chunk_size)]
+    cleaned_chunks = list(executor.map(_clean_chunk, chunks))
+    chunk_lengths = [sum(map(len, chunk)) for chunk in cleaned_chunks]
+    offsets = [0] + list(accumulate(chunk_lengths))
+    keystream = bytes(Deck(deck).take_keystream(offsets[-1]))
+    keystream_chunks = [keystream[offsets[i]:offsets[i + 1]]
+                        for i in range(len(cleaned_chunks))]
+    actions = [action] * len(cleaned_chunks)
+    result = []
+    for processed_chunk in executor.map(_process_chunk, cleaned_chunks,
+                                        keystream_chunks, actions):
+        result.extend(processed_chunk)
+    return result
+
+
+def _clean_chunk(messages: List[str]) -> List[str]:
+    """Return the cleaned version of each message in messages.
+
+    >>> _clean_chunk(['Hello world!', '88test'])
+    ['HELLOWORLD', 'TEST']
+    """
+
+    return normalize_messages(messages)
+
+
+def _process_chunk(cleaned_messages: List[str], keystream: bytes,
+                   action: str) -> List[str]:
+    """Return cleaned_messages modified according to action, taking each
+    message's keystream values from keystream in order.
+
+    >>> _process_chunk(['ABC', 'DEF'], bytes([19, 17, 24, 15, 5, 12]), 'e')
+    ['TSA', 'SJR']
+    """
+
+    result = []
+    offset = 0
+    for cleaned_message in cleaned_messages:
+        end = offset + len(cleaned_message)
+        result.append(process_cleaned_message(cleaned_message,
+                                              keystream[offset:end], action))
+        offset = end
+    return result
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
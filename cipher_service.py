@@ -0,0 +1,198 @@
+"""An asyncio server that encrypts and decrypts messages for many sessions
+
+Each connection is a session with its own deck. Requests are lines:
+
+  E <message>     reply with the encrypted message
+  D <message>     reply with the decrypted message
+  K <28 cards>    replace the session's deck, reply OK
+
+Every request gets exactly one reply line, in order, and a reply to a bad
+request starts with ERR. Clients may send many requests without waiting
+for replies.
+"""
+
+import asyncio
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from cipher_deck import Deck
+from cipher_functions import (
+    ENCRYPT, DECRYPT, is_valid_deck, process_cleaned_message)
+from text_normalize import normalize_message
+
+# The most bytes read from a client at once; every complete request line in
+# one read is handled as a single batch.
+READ_SIZE = 1 << 16
+
+# The longest request line accepted, in bytes.
+MAX_LINE_LENGTH = 1 << 20
+
+
+def process_requests(engine: Deck, lines: List[bytes]) -> bytes:
+    """Return the reply lines for the request lines in lines, taking
+    keystream values from engine. Each run of E and D requests takes its
+    keystream from engine in one call.
+
+    >>> engine = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+    >>> process_requests(engine, [b'E a7b%c', b'E d7e*f '])
+    b'TSA\\nSJR\\n'
+    >>> process_requests(engine, [b'K 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20 21 22 23 24 25 26 27 28', b'D T S6%A', b'X', b'D S8*J R'])
+    b'OK\\nABC\\nERR unknown request\\nDEF\\n'
+
+    Precondition: no line contains a newline
+    """
+
+    replies = []
+    pending = []
+    for line in lines:
+        command, _, argument = line.decode('utf-8', 'replace').partition(' ')
+        if command == 'E' or command == 'D':
+            action = ENCRYPT if command == 'E' else DECRYPT
+            pending.append((action, normalize_message(argument)))
+        else:
+            replies.extend(_process_pending(engine, pending))
+            pending = []
+            if command == 'K':
+                replies.append(_replace_deck(engine, argument))
+            else:
+                replies.append('ERR unknown request')
+    replies.extend(_process_pending(engine, pending))
+    return ''.join(reply + '\n' for reply in replies).encode('utf-8')
+
+
+def _process_pending(engine: Deck,
+                     pending: List[Tuple[str, str]]) -> List[str]:
+    """Return the replies for the (action, cleaned message) requests in
+    pending, taking all of their keystream values from engine at once.
+
+    >>> engine = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+    >>> _process_pending(engine, [('e', 'ABC'), ('e', 'DEF')])
+    ['TSA', 'SJR']
+    """
+
+    keystream = memoryview(engine.take_keystream(
+        sum(len(cleaned_message) for _, cleaned_message in pending)))
+    replies = []
+    offset = 0
+    for action, cleaned_message in pending:
+        end = offset + len(cleaned_message)
+        replies.append(process_cleaned_message(
+            cleaned_message, keystream[offset:end], action))
+        offset = end
+    return replies
+
+
+def _replace_deck(engine: Deck, argument: str) -> str:
+    """Replace the cards of engine with the cards listed in argument and
+    return the reply for the request.
+
+    >>> engine = Deck(list(range(1, 29)))
+    >>> _replace_deck(engine, ' '.join(map(str, range(28, 0, -1))))
+    'OK'
+    >>> engine.cards[:3]
+    [28, 27, 26]
+    >>> _replace_deck(engine, '1 2 3')
+    'ERR invalid deck'
+    """
+
+    try:
+        cards = [int(card) for card in argument.split()]
+    except ValueError:
+        return 'ERR invalid deck'
+    if len(cards) != 28 or not is_valid_deck(cards):
+        return 'ERR invalid deck'
+    engine.reset(cards)
+    return 'OK'
+
+
+async def handle_session(reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter,
+                         deck: List[int]) -> None:
+    """Serve one client session on reader and writer, starting from a copy
+    of deck.
+
+    All complete request lines that arrive in one read are handled as one
+    batch, in the event loop's default executor so that a large batch does
+    not hold up other sessions. The next read waits until the replies have
+    drained, so a client that stops reading replies stops being served.
+    """
+
+    loop = asyncio.get_running_loop()
+    engine = Deck(deck[:])
+    partial_line = b''
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                # A last request need not end with a newline.
+                if partial_line:
+                    replies = await loop.run_in_executor(
+                        None, process_requests, engine,
+                        [partial_line.rstrip(b'\r')])
+                    writer.write(replies)
+                    await writer.drain()
+                break
+            lines = (partial_line + data).split(b'\n')
+            partial_line = lines.pop()
+            if len(partial_line) > MAX_LINE_LENGTH:
+                writer.write(b'ERR request too long\n')
+                break
+            if lines:
+                replies = await loop.run_in_executor(
+                    None, process_requests, engine,
+                    [line.rstrip(b'\r') for line in lines])
+                writer.write(replies)
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(deck: List[int], host: Optional[str] = '127.0.0.1',
+                       port: int = 0,
+                       path: Optional[str] = None) -> asyncio.AbstractServer:
+    """Start serving sessions that begin with deck, on a Unix socket at path
+    if path is given and on a TCP socket at host and port otherwise.
+
+    >>> async def demo():
+    ...     server = await start_server(list(range(1, 29)))
+    ...     host, port = server.sockets[0].getsockname()[:2]
+    ...     reader, writer = await asyncio.open_connection(host, port)
+    ...     writer.write(b'E a7b%c\\nE d7e*f ')
+    ...     writer.write_eof()
+    ...     replies = await reader.read()
+    ...     writer.close()
+    ...     server.close()
+    ...     await server.wait_closed()
+    ...     return replies
+    >>> asyncio.run(demo())
+    b'TSA\\nSJR\\n'
+
+    Precondition: deck is a valid deck
+    """
+
+    async def serve_client(reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        await handle_session(reader, writer, deck)
+
+    if path is not None:
+        return await asyncio.start_unix_server(serve_client, path)
+    return await asyncio.start_server(serve_client, host, port)
+
+
+async def serve_forever(deck: List[int], host: Optional[str] = '127.0.0.1',
+                        port: int = 0, path: Optional[str] = None) -> None:
+    """Serve sessions that begin with deck until cancelled, as described in
+    start_server.
+    """
+
+    server = await start_server(deck, host, port, path)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
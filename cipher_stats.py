@@ -0,0 +1,271 @@
+"""A parallel harness for testing keystream values for bias
+"""
+
+import operator
+import random
+from collections import Counter
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from typing import Optional
+
+from cipher_deck import Deck
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Keystream values from a 28-card deck are 1 to KEYSTREAM_RANGE.
+KEYSTREAM_RANGE = 26
+
+# How many keystream values are generated and counted at a time.
+CHUNK_SIZE = 1 << 14
+
+# How many tasks run_statistics splits its decks into. This is fixed rather
+# than tied to the number of cores, so that reports are reproducible.
+DEFAULT_TASK_COUNT = 64
+
+
+class KeystreamStats:
+    """Running statistics over one or more keystreams: how often each value
+    and each pair of consecutive values occurs, and the sums needed for the
+    lag-1 serial correlation.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty statistics.
+
+        >>> stats = KeystreamStats()
+        >>> stats.count, len(stats.value_counts), len(stats.pair_counts)
+        (0, 27, 729)
+        """
+
+        self.count = 0
+        # value_counts[v] counts value v; pair_counts[a * 27 + b] counts b
+        # straight after a. Index 0 is never used.
+        self.value_counts = [0] * (KEYSTREAM_RANGE + 1)
+        self.pair_counts = [0] * (KEYSTREAM_RANGE + 1) ** 2
+        self.pair_count = 0
+        self.value_sum = 0
+        self.square_sum = 0
+        self.product_sum = 0
+
+    def add(self, values: bytes, previous: int = 0) -> None:
+        """Count the consecutive keystream values in values. If previous is
+        not 0, it is the value just before values, and only the pair it forms
+        with values[0] is counted.
+
+        >>> stats = KeystreamStats()
+        >>> stats.add(bytes([1, 2, 1]))
+        >>> stats.value_counts[1], stats.value_counts[2], stats.pair_count
+        (2, 1, 2)
+        >>> stats.add(bytes([3]), 1)
+        >>> stats.pair_counts[1 * 27 + 3], stats.pair_count, stats.count
+        (1, 3, 4)
+
+        Precondition: every value is from 1 to KEYSTREAM_RANGE
+        """
+
+        width = KEYSTREAM_RANGE + 1
+        if previous and values:
+            self.pair_counts[previous * width + values[0]] += 1
+            self.pair_count += 1
+            self.product_sum += previous * values[0]
+        self.count += len(values)
+        self.pair_count += max(len(values) - 1, 0)
+        if numpy is not None:
+            array = numpy.frombuffer(values, dtype=numpy.uint8).astype(
+                numpy.int64)
+            value_counts = numpy.bincount(array, minlength=width)
+            pair_counts = numpy.bincount(array[:-1] * width + array[1:],
+                                         minlength=width * width)
+            self.value_sum += int(array.sum())
+            self.square_sum += int(array.dot(array))
+            self.product_sum += int(array[:-1].dot(array[1:]))
+            self._merge_counts(value_counts.tolist(), pair_counts.tolist())
+            return
+        value_counts = [values.count(value) for value in range(width)]
+        pairs = Counter(map(operator.add, map(width.__mul__, values[:-1]),
+                            values[1:]))
+        pair_counts = [0] * (width * width)
+        for pair, pair_count in pairs.items():
+            pair_counts[pair] = pair_count
+        self.value_sum += sum(values)
+        self.square_sum += sum(map(operator.mul, values, values))
+        self.product_sum += sum(map(operator.mul, values[:-1], values[1:]))
+        self._merge_counts(value_counts, pair_counts)
+
+    def merge(self, other: 'KeystreamStats') -> None:
+        """Add the statistics in other to these statistics.
+
+        >>> stats = KeystreamStats()
+        >>> other = KeystreamStats()
+        >>> other.add(bytes([3, 4]))
+        >>> stats.merge(other)
+        >>> stats.count, stats.value_counts[4], stats.product_sum
+        (2, 1, 12)
+        """
+
+        self.count += other.count
+        self.pair_count += other.pair_count
+        self.value_sum += other.value_sum
+        self.square_sum += other.square_sum
+        self.product_sum += other.product_sum
+        self._merge_counts(other.value_counts, other.pair_counts)
+
+    def _merge_counts(self, value_counts: List[int],
+                      pair_counts: List[int]) -> None:
+        """Add value_counts and pair_counts to the counts kept here.
+        """
+
+        self.value_counts = list(map(operator.add, self.value_counts,
+                                     value_counts))
+        self.pair_counts = list(map(operator.add, self.pair_counts,
+                                    pair_counts))
+
+    def chi_square(self) -> float:
+        """Return the chi-square statistic of the value counts against a
+        uniform distribution over 1 to KEYSTREAM_RANGE, with
+        KEYSTREAM_RANGE - 1 degrees of freedom.
+
+        >>> stats = KeystreamStats()
+        >>> stats.add(bytes(range(1, 27)) * 4)
+        >>> stats.chi_square()
+        0.0
+        """
+
+        expected = self.count / KEYSTREAM_RANGE
+        return sum((observed - expected) ** 2 / expected
+                   for observed in self.value_counts[1:])
+
+    def pair_chi_square(self) -> float:
+        """Return the chi-square statistic of the consecutive pair counts
+        against a uniform distribution over all KEYSTREAM_RANGE ** 2 pairs.
+
+        >>> stats = KeystreamStats()
+        >>> stats.add(bytes([1, 1]))
+        >>> round(stats.pair_chi_square())
+        675
+        """
+
+        width = KEYSTREAM_RANGE + 1
+        expected = self.pair_count / KEYSTREAM_RANGE ** 2
+        return sum((self.pair_counts[first * width + second] - expected) ** 2
+                   / expected
+                   for first in range(1, width) for second in range(1, width))
+
+    def serial_correlation(self) -> float:
+        """Return the lag-1 serial correlation of the values, treating the
+        pairs counted by add as (x, y) samples.
+
+        >>> stats = KeystreamStats()
+        >>> stats.add(bytes([1, 2, 3, 4, 5]))
+        >>> round(stats.serial_correlation(), 3)
+        0.5
+        """
+
+        count = self.count
+        mean = self.value_sum / count
+        variance = self.square_sum / count - mean * mean
+        covariance = self.product_sum / self.pair_count - mean * mean
+        return covariance / variance
+
+
+def keystream_statistics(seed: int, deck_count: int,
+                         length: int) -> KeystreamStats:
+    """Return statistics over length keystream values from each of
+    deck_count random 28-card decks, shuffled by a generator seeded with
+    seed.
+
+    >>> stats = keystream_statistics(0, 2, 100)
+    >>> stats.count, stats.pair_count
+    (200, 198)
+    >>> keystream_statistics(0, 2, 100).value_counts == stats.value_counts
+    True
+    """
+
+    rng = random.Random(seed)
+    stats = KeystreamStats()
+    buffer = bytearray(CHUNK_SIZE)
+    for _ in range(deck_count):
+        cards = list(range(1, 29))
+        rng.shuffle(cards)
+        deck = Deck(cards)
+        previous = 0
+        remaining = length
+        while remaining > 0:
+            chunk_length = min(remaining, CHUNK_SIZE)
+            deck.fill_keystream(buffer, 0, chunk_length)
+            stats.add(bytes(buffer[:chunk_length]), previous)
+            previous = buffer[chunk_length - 1]
+            remaining -= chunk_length
+    return stats
+
+
+def run_statistics(deck_count: int, length: int, seed: int = 0,
+                   task_count: int = DEFAULT_TASK_COUNT,
+                   executor: Optional[Executor] = None) -> KeystreamStats:
+    """Return statistics over length keystream values from each of
+    deck_count random decks, split into task_count tasks run on executor.
+    If executor is None, a ProcessPoolExecutor is created for the call.
+
+    Each task shuffles its decks with its own seed drawn from seed, so the
+    result depends only on the arguments, not on the executor or the number
+    of cores.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     stats = run_statistics(5, 50, 1, 3, executor)
+    >>> stats.count
+    250
+    >>> with ThreadPoolExecutor(3) as executor:
+    ...     run_statistics(5, 50, 1, 3, executor).pair_counts == stats.pair_counts
+    True
+
+    Precondition: deck_count >= 0, length > 0, task_count > 0
+    """
+
+    if executor is None:
+        with ProcessPoolExecutor() as own_executor:
+            return run_statistics(deck_count, length, seed, task_count,
+                                  own_executor)
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(task_count)]
+    deck_counts = [deck_count // task_count +
+                   (1 if task < deck_count % task_count else 0)
+                   for task in range(task_count)]
+    stats = KeystreamStats()
+    for task_stats in executor.map(keystream_statistics, seeds, deck_counts,
+                                   [length] * task_count):
+        stats.merge(task_stats)
+    return stats
+
+
+def format_report(stats: KeystreamStats) -> str:
+    """Return a plain-text report of stats.
+
+    >>> stats = KeystreamStats()
+    >>> stats.add(bytes(range(1, 27)) * 2)
+    >>> print(format_report(stats).splitlines()[1])
+    values: 52
+    """
+
+    lines = ['Keystream statistics',
+             'values: {}'.format(stats.count),
+             'value chi-square: {:.3f} ({} degrees of freedom)'.format(
+                 stats.chi_square(), KEYSTREAM_RANGE - 1),
+             'pair chi-square: {:.3f} ({} degrees of freedom)'.format(
+                 stats.pair_chi_square(), KEYSTREAM_RANGE ** 2 - 1),
+             'lag-1 serial correlation: {:.6f}'.format(
+                 stats.serial_correlation()),
+             'value frequencies:']
+    for value in range(1, KEYSTREAM_RANGE + 1):
+        lines.append('{:3d} {:.6f}'.format(
+            value, stats.value_counts[value] / stats.count))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,130 @@
+"""Functions for encrypting and decrypting streams of any length
+"""
+
+import codecs
+import io
+from typing import BinaryIO
+from typing import List
+from typing import Optional
+from typing import Union
+
+from cipher_deck import Deck
+from cipher_functions import clean_message, process_cleaned_message
+
+# How many characters or bytes are read from the source at a time.
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def process_stream(deck: List[int], source: Union[io.TextIOBase, BinaryIO],
+                   destination: Union[io.TextIOBase, BinaryIO], action: str,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   text_output: Optional[bool] = None) -> int:
+    """Read source chunk by chunk, clean each chunk and write it to
+    destination modified according to action, with keystream values
+    continuing from one chunk to the next. Return the number of letters
+    written.
+
+    The output is what process_messages(deck, [source contents], action)
+    would return, and deck is moved on in the same way. Only one chunk is
+    held in memory at a time. A binary source is decoded as UTF-8, with
+    bytes that are not valid UTF-8 dropped like any other non-letter.
+
+    str is written to destination if text_output is True and UTF-8 bytes
+    if it is False. If text_output is None, destination is taken to be
+    text if it is an io.TextIOBase or has a mode without 'b' in it, and
+    binary otherwise.
+
+    >>> import io
+    >>> destination = io.StringIO()
+    >>> process_stream([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], io.StringIO("a7b%c d7e*f "), destination, 'e', 4)
+    6
+    >>> destination.getvalue()
+    'TSASJR'
+    >>> destination = io.BytesIO()
+    >>> process_stream([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], io.BytesIO(b'T S6%A S8*J R'), destination, 'd', 3)
+    6
+    >>> destination.getvalue()
+    b'ABCDEF'
+    >>> destination = io.StringIO()
+    >>> process_stream([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], io.BytesIO(b'ab\\xffc'), destination, 'e', 2)
+    3
+    >>> destination.getvalue()
+    'TSA'
+    >>> chunks = []
+    >>> class Sink:
+    ...     write = chunks.append
+    >>> process_stream([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28], io.StringIO('abc'), Sink(), 'e', text_output=True)
+    3
+    >>> chunks
+    ['TSA']
+
+    Precondition: the deck is a valid deck with at least two elements,
+    action is either 'e' or 'd', chunk_size > 0
+    """
+
+    engine = Deck(deck)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    if text_output is None:
+        text_output = _is_text_destination(destination)
+    letter_count = 0
+    chunk = source.read(chunk_size)
+    while chunk:
+        if not isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        letter_count += _process_chunk(engine, chunk, destination, action,
+                                       text_output)
+        chunk = source.read(chunk_size)
+    letter_count += _process_chunk(engine, decoder.decode(b'', True),
+                                   destination, action, text_output)
+    return letter_count
+
+
+def _is_text_destination(destination: object) -> bool:
+    """Return True if and only if destination looks like it takes str: it is
+    an io.TextIOBase, or it has a mode without 'b' in it.
+
+    >>> import io
+    >>> _is_text_destination(io.StringIO()), _is_text_destination(io.BytesIO())
+    (True, False)
+    >>> class Pipe:
+    ...     mode = 'w'
+    >>> _is_text_destination(Pipe())
+    True
+    """
+
+    if isinstance(destination, io.TextIOBase):
+        return True
+    mode = getattr(destination, 'mode', None)
+    return isinstance(mode, str) and 'b' not in mode
+
+
+def _process_chunk(engine: Deck, chunk: str,
+                   destination: Union[io.TextIOBase, BinaryIO], action: str,
+                   text_output: bool) -> int:
+    """Clean chunk, write it to destination modified according to action with
+    keystream values from engine, and return the number of letters written.
+
+    >>> import io
+    >>> destination = io.StringIO()
+    >>> engine = Deck([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28])
+    >>> _process_chunk(engine, 'a b!c', destination, 'e', True)
+    3
+    >>> destination.getvalue()
+    'TSA'
+    """
+
+    cleaned_chunk = clean_message(chunk)
+    if not cleaned_chunk:
+        return 0
+    keystream = engine.take_keystream(len(cleaned_chunk))
+    processed_chunk = process_cleaned_message(cleaned_chunk, keystream, action)
+    if text_output:
+        destination.write(processed_chunk)
+    else:
+        destination.write(processed_chunk.encode('utf-8'))
+    return len(processed_chunk)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
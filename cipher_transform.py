@@ -0,0 +1,113 @@
+"""Functions for encrypting and decrypting whole messages at once
+"""
+
+from typing import Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Any buffer of unsigned bytes: bytes, bytearray, array('B') or memoryview.
+KEYSTREAM_BUFFER = Union[bytes, bytearray, memoryview]
+
+
+def _build_encrypt_table() -> bytes:
+    """Return a table from ord(letter) + keystream_value to the encrypted
+    letter, computed exactly as cipher_functions.encrypt_letter does.
+
+    >>> table = _build_encrypt_table()
+    >>> chr(table[ord('B') + 3]), chr(table[ord('Z') + 1])
+    ('E', 'A')
+    """
+
+    table = bytearray(256)
+    for total in range(256):
+        encrypted_value = total - 64
+        if encrypted_value > 26:
+            encrypted_value = encrypted_value % 26
+        table[total] = encrypted_value + 64
+    return bytes(table)
+
+
+def _build_decrypt_table() -> bytes:
+    """Return a table from ord(letter) - keystream_value to the decrypted
+    letter, computed exactly as cipher_functions.decrypt_letter does.
+
+    >>> table = _build_decrypt_table()
+    >>> chr(table[ord('A') - 1]), chr(table[ord('E') - 3])
+    ('Z', 'B')
+    """
+
+    table = bytearray(256)
+    for difference in range(256):
+        decrypted_value = difference - 64
+        if decrypted_value < 1:
+            decrypted_value = decrypted_value + 26
+        table[difference] = decrypted_value + 64
+    return bytes(table)
+
+
+ENCRYPT_TABLE = _build_encrypt_table()
+DECRYPT_TABLE = _build_decrypt_table()
+
+if numpy is not None:
+    _NUMPY_ENCRYPT_TABLE = numpy.frombuffer(ENCRYPT_TABLE, dtype=numpy.uint8)
+    _NUMPY_DECRYPT_TABLE = numpy.frombuffer(DECRYPT_TABLE, dtype=numpy.uint8)
+
+
+def encrypt_message(cleaned_message: str, keystream: KEYSTREAM_BUFFER) -> str:
+    """Return cleaned_message encrypted with one keystream value per letter,
+    matching encrypt_letter applied to each letter in turn.
+
+    >>> encrypt_message('ABC', bytes([19, 17, 24]))
+    'TSA'
+    >>> encrypt_message('HELLOWORLD', bytearray([1] * 12))
+    'IFMMPXPSME'
+
+    Precondition: cleaned_message contains only the letters A to Z, keystream
+    holds at least len(cleaned_message) values, each from 1 to 26
+    """
+
+    letters = cleaned_message.encode('ascii')
+    keys = memoryview(keystream)[:len(letters)]
+    if numpy is not None:
+        totals = numpy.frombuffer(letters, dtype=numpy.uint8) + \
+            numpy.frombuffer(keys, dtype=numpy.uint8)
+        return _NUMPY_ENCRYPT_TABLE[totals].tobytes().decode('ascii')
+    # Each letter plus its keystream value stays below 256, so adding the
+    # buffers as big-endian integers never carries from one byte to the next.
+    totals = int.from_bytes(letters, 'big') + int.from_bytes(keys, 'big')
+    return totals.to_bytes(len(letters), 'big').translate(
+        ENCRYPT_TABLE).decode('ascii')
+
+
+def decrypt_message(cleaned_message: str, keystream: KEYSTREAM_BUFFER) -> str:
+    """Return cleaned_message decrypted with one keystream value per letter,
+    matching decrypt_letter applied to each letter in turn.
+
+    >>> decrypt_message('TSA', bytes([19, 17, 24]))
+    'ABC'
+    >>> decrypt_message('IFMMPXPSME', bytearray([1] * 12))
+    'HELLOWORLD'
+
+    Precondition: cleaned_message contains only the letters A to Z, keystream
+    holds at least len(cleaned_message) values, each from 1 to 26
+    """
+
+    letters = cleaned_message.encode('ascii')
+    keys = memoryview(keystream)[:len(letters)]
+    if numpy is not None:
+        differences = numpy.frombuffer(letters, dtype=numpy.uint8) - \
+            numpy.frombuffer(keys, dtype=numpy.uint8)
+        return _NUMPY_DECRYPT_TABLE[differences].tobytes().decode('ascii')
+    # Each letter is larger than its keystream value, so subtracting the
+    # buffers as big-endian integers never borrows from the next byte.
+    differences = int.from_bytes(letters, 'big') - int.from_bytes(keys, 'big')
+    return differences.to_bytes(len(letters), 'big').translate(
+        DECRYPT_TABLE).decode('ascii')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,290 @@
+"""Guessing the pronunciation of words missing from the pronouncing dictionary
+"""
+
+from collections import OrderedDict
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from poetry_constants import (
+    CLEAN_POEM, POEM_PRONUNCIATION, PRONOUNCING_DICTIONARY, WORD_PHONEMES)
+from poetry_phonemes import decode_phonemes, is_compact
+
+# The shortest stem or part of a compound word that is looked up.
+MIN_PART_LENGTH = 2
+
+# The longest word that is taken apart. Each part taken off a word goes one
+# call deeper, so this also bounds how deep resolve goes.
+MAX_WORD_LENGTH = 64
+
+# The most words an AffixResolver remembers by default.
+DEFAULT_MAX_SIZE = 1 << 16
+
+# Phonemes after which the suffixes S, ES and ED add a vowel.
+_SIBILANTS = frozenset(['S', 'Z', 'SH', 'ZH', 'CH', 'JH'])
+_VOICELESS = frozenset(['P', 'T', 'K', 'F', 'TH', 'S', 'SH', 'CH'])
+
+
+def _plural_phonemes(last_phoneme: str) -> WORD_PHONEMES:
+    """Return the phonemes that S adds after a stem ending in last_phoneme.
+    """
+
+    if last_phoneme in _SIBILANTS:
+        return ['IH0', 'Z']
+    if last_phoneme in _VOICELESS:
+        return ['S']
+    return ['Z']
+
+
+def _plural_es_phonemes(last_phoneme: str) -> Optional[WORD_PHONEMES]:
+    """Return the phonemes that ES adds after a stem ending in last_phoneme,
+    or None if ES is not an ending for such a stem.
+    """
+
+    return ['IH0', 'Z'] if last_phoneme in _SIBILANTS else None
+
+
+def _past_phonemes(last_phoneme: str) -> WORD_PHONEMES:
+    """Return the phonemes that ED adds after a stem ending in last_phoneme.
+    """
+
+    if last_phoneme in ('T', 'D'):
+        return ['IH0', 'D']
+    if last_phoneme in _VOICELESS:
+        return ['T']
+    return ['D']
+
+
+def _fixed(phonemes: WORD_PHONEMES) -> Callable[[str], WORD_PHONEMES]:
+    """Return a suffix rule that always adds phonemes.
+    """
+
+    return lambda last_phoneme: phonemes
+
+
+# (suffix, stem spellings to try as (letters to add, letters to double),
+# rule from the stem's last phoneme to the phonemes the suffix adds), most
+# specific first. A stem spelling ('E', False) tries HOPE for HOPED, and
+# ('', True) tries RUN for RUNNING.
+_SUFFIXES = (
+    ("'S", (('', False),), _plural_phonemes),
+    ('IES', (('Y', False),), _fixed(['Z'])),
+    ('IED', (('Y', False),), _fixed(['D'])),
+    ('ES', (('', False),), _plural_es_phonemes),
+    ('S', (('', False),), _plural_phonemes),
+    ('ED', (('E', False), ('', True), ('', False)), _past_phonemes),
+    ('ING', (('', False), ('E', False), ('', True)), _fixed(['IH0', 'NG'])),
+    ('ERS', (('', False), ('E', False), ('', True)), _fixed(['ER0', 'Z'])),
+    ('ER', (('', False), ('E', False), ('', True)), _fixed(['ER0'])),
+    ('EST', (('', False), ('E', False), ('', True)),
+     _fixed(['AH0', 'S', 'T'])),
+    ('LY', (('', False),), _fixed(['L', 'IY0'])),
+    ('NESS', (('', False),), _fixed(['N', 'AH0', 'S'])),
+    ('LESS', (('', False),), _fixed(['L', 'AH0', 'S'])),
+    ('FUL', (('', False),), _fixed(['F', 'AH0', 'L'])),
+    ('MENT', (('', False),), _fixed(['M', 'AH0', 'N', 'T'])),
+)
+
+_PREFIXES = (
+    ('UNDER', ['AH2', 'N', 'D', 'ER0']),
+    ('OVER', ['OW2', 'V', 'ER0']),
+    ('OUT', ['AW2', 'T']),
+    ('DIS', ['D', 'IH0', 'S']),
+    ('MIS', ['M', 'IH0', 'S']),
+    ('NON', ['N', 'AA2', 'N']),
+    ('PRE', ['P', 'R', 'IY0']),
+    ('RE', ['R', 'IY0']),
+    ('UN', ['AH0', 'N']),
+)
+
+
+class AffixResolver:
+    """Finds pronunciations for words that are not in a pronouncing
+    dictionary by taking them apart into dictionary words and common
+    prefixes and suffixes: stem plus S, ED, ING and so on, prefix plus word,
+    or two words run together.
+
+    The last max_size words asked for that are not in the dictionary are
+    remembered, resolved or not, least recently used first. The parts tried
+    while taking a word apart are remembered only until it is resolved.
+    hits, misses and evictions count as WordCache's counters do.
+    """
+
+    def __init__(self, word_to_phonemes: PRONOUNCING_DICTIONARY,
+                 max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Initialize a resolver over the pronouncing dictionary
+        word_to_phonemes that remembers at most max_size words.
+
+        >>> resolver = AffixResolver({'NO': ['N', 'OW1']}, 2)
+        >>> len(resolver.resolved), resolver.max_size
+        (0, 2)
+        >>> [resolver.resolve(word) is None for word in ('NOS', 'XS', 'YS', 'NOS')]
+        [False, True, True, False]
+        >>> list(resolver.resolved), resolver.hits, resolver.misses, resolver.evictions
+        (['YS', 'NOS'], 0, 4, 2)
+
+        Precondition: max_size > 0
+        """
+
+        self.word_to_phonemes = word_to_phonemes
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Word -> its phonemes, or None if it could not be resolved, least
+        # recently used first.
+        self.resolved = OrderedDict()
+
+    def resolve(self, word: str) -> Optional[WORD_PHONEMES]:
+        """Return the phonemes of the cleaned word word: its phonemes in the
+        dictionary if it is there, otherwise phonemes put together from the
+        parts it can be taken apart into, or None if it cannot be or is
+        longer than MAX_WORD_LENGTH.
+
+        >>> resolver = AffixResolver({'CAT': ['K', 'AE1', 'T'], 'HOPE': ['HH', 'OW1', 'P'], 'RUN': ['R', 'AH1', 'N'], 'SUN': ['S', 'AH1', 'N'], 'LIGHT': ['L', 'AY1', 'T'], 'BOX': ['B', 'AA1', 'K', 'S']})
+        >>> resolver.resolve('CATS'), resolver.resolve('HOPED'), resolver.resolve('BOXES')
+        (['K', 'AE1', 'T', 'S'], ['HH', 'OW1', 'P', 'T'], ['B', 'AA1', 'K', 'S', 'IH0', 'Z'])
+        >>> resolver.resolve('RUNNING'), resolver.resolve('SUNLIGHT')
+        (['R', 'AH1', 'N', 'IH0', 'NG'], ['S', 'AH1', 'N', 'L', 'AY1', 'T'])
+        >>> resolver.resolve('UNHOPEFULNESS'), resolver.resolve('XYZZY')
+        (['AH0', 'N', 'HH', 'OW1', 'P', 'F', 'AH0', 'L', 'N', 'AH0', 'S'], None)
+        >>> resolver.resolve('CAT' + 'S' * MAX_WORD_LENGTH) is None
+        True
+        """
+
+        phonemes = self.word_to_phonemes.get(word)
+        if phonemes is not None:
+            if is_compact(phonemes):
+                return decode_phonemes(phonemes)
+            return phonemes
+        resolved = self.resolved
+        if word in resolved:
+            self.hits += 1
+            resolved.move_to_end(word)
+            return resolved[word]
+        self.misses += 1
+        phonemes = self._resolve(word, {})
+        resolved[word] = phonemes
+        if len(resolved) > self.max_size:
+            resolved.popitem(False)
+            self.evictions += 1
+        return phonemes
+
+    def _resolve(self, word: str, parts: Dict[str, Optional[WORD_PHONEMES]]
+                 ) -> Optional[WORD_PHONEMES]:
+        """Return the phonemes of word as resolve does, remembering the
+        phonemes of the words tried in parts rather than in this resolver.
+        """
+
+        phonemes = self.word_to_phonemes.get(word)
+        if phonemes is not None:
+            if is_compact(phonemes):
+                return decode_phonemes(phonemes)
+            return phonemes
+        if word in parts:
+            return parts[word]
+        if word in self.resolved:
+            return self.resolved[word]
+        if len(word) > MAX_WORD_LENGTH:
+            return None
+        # Every part tried is shorter than word, so this always ends.
+        phonemes = self._resolve_suffix(word, parts)
+        if phonemes is None:
+            phonemes = self._resolve_prefix(word, parts)
+        if phonemes is None:
+            phonemes = self._resolve_compound(word, parts)
+        parts[word] = phonemes
+        return phonemes
+
+    def _resolve_suffix(self, word: str,
+                        parts: Dict[str, Optional[WORD_PHONEMES]]
+                        ) -> Optional[WORD_PHONEMES]:
+        """Return the phonemes of word as a stem plus a suffix, or None.
+        """
+
+        for suffix, spellings, rule in _SUFFIXES:
+            if not word.endswith(suffix):
+                continue
+            stem = word[:-len(suffix)]
+            for added, doubled in spellings:
+                if doubled:
+                    if len(stem) < 2 or stem[-1] != stem[-2]:
+                        continue
+                    candidate = stem[:-1]
+                else:
+                    candidate = stem + added
+                if len(candidate) < MIN_PART_LENGTH:
+                    continue
+                stem_phonemes = self._resolve(candidate, parts)
+                if stem_phonemes:
+                    suffix_phonemes = rule(stem_phonemes[-1])
+                    if suffix_phonemes is not None:
+                        return stem_phonemes + suffix_phonemes
+        return None
+
+    def _resolve_prefix(self, word: str,
+                        parts: Dict[str, Optional[WORD_PHONEMES]]
+                        ) -> Optional[WORD_PHONEMES]:
+        """Return the phonemes of word as a prefix plus a word, or None.
+        """
+
+        for prefix, prefix_phonemes in _PREFIXES:
+            if word.startswith(prefix) and \
+               len(word) - len(prefix) >= MIN_PART_LENGTH:
+                rest_phonemes = self._resolve(word[len(prefix):], parts)
+                if rest_phonemes:
+                    return prefix_phonemes + rest_phonemes
+        return None
+
+    def _resolve_compound(self, word: str,
+                          parts: Dict[str, Optional[WORD_PHONEMES]]
+                          ) -> Optional[WORD_PHONEMES]:
+        """Return the phonemes of word as a dictionary word followed by a
+        word, trying the longest first word first, or None.
+        """
+
+        for split in range(len(word) - MIN_PART_LENGTH, MIN_PART_LENGTH - 1,
+                           -1):
+            first_phonemes = self.word_to_phonemes.get(word[:split])
+            if first_phonemes is not None:
+                rest_phonemes = self._resolve(word[split:], parts)
+                if rest_phonemes:
+                    if is_compact(first_phonemes):
+                        first_phonemes = decode_phonemes(first_phonemes)
+                    return first_phonemes + rest_phonemes
+        return None
+
+    def extract_phonemes(self, cleaned_poem: CLEAN_POEM) -> Tuple[
+            POEM_PRONUNCIATION, List[str]]:
+        """Return the pronunciation of cleaned_poem, as extract_phonemes
+        gives it, and the words of cleaned_poem that could not be resolved,
+        in order. Each of those words has no phonemes in the pronunciation,
+        so get_rhyme_scheme gives a line ending in one no rhyme letter.
+
+        >>> resolver = AffixResolver({'YES': ['Y', 'EH1', 'S'], 'NO': ['N', 'OW1']})
+        >>> resolver.extract_phonemes([['YESES'], ['NO', 'YES', 'MAYBE']])
+        ([[['Y', 'EH1', 'S', 'IH0', 'Z']], [['N', 'OW1'], ['Y', 'EH1', 'S'], []]], ['MAYBE'])
+        >>> from poetry_functions import get_rhyme_scheme
+        >>> get_rhyme_scheme(resolver.extract_phonemes([['YES'], ['NO', 'MAYBE']])[0])
+        ['A', '']
+        """
+
+        poem_of_phonemes = []
+        unresolved_words = []
+        for line in cleaned_poem:
+            line_of_phonemes = []
+            for word in line:
+                phonemes = self.resolve(word)
+                if phonemes is None:
+                    unresolved_words.append(word)
+                    phonemes = []
+                line_of_phonemes.append(phonemes)
+            poem_of_phonemes.append(line_of_phonemes)
+        return poem_of_phonemes, unresolved_words
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,192 @@
+"""Functions for checking large batches of poems on several cores
+"""
+
+from collections import deque
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from threading import local
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from poetry_constants import (
+    LINE_DIAGNOSTIC, POETRY_FORMS, PRONOUNCING_DICTIONARY)
+from poetry_affixes import AffixResolver
+from poetry_cache import WordCache
+from poetry_dictionary import load_pronouncing_dictionary
+from poetry_forms import (
+    FormMatcher, PoemLines, compile_poetry_forms, match_poetry_forms)
+from poetry_functions import label_rhyme_endings
+
+# How many poems each worker task checks.
+DEFAULT_CHUNK_SIZE = 64
+
+# How many chunks may be waiting on the executor at once, which bounds the
+# memory used however long the input is.
+DEFAULT_MAX_PENDING = 32
+
+# The result of checking one poem: (poem id, names of the forms it matches,
+# one diagnostic per line).
+POEM_CHECK = Tuple[object, List[str], List[LINE_DIAGNOSTIC]]
+
+# Dictionary path -> pronouncing dictionary, loaded once per process.
+_DICTIONARIES = {}
+
+# Holds each thread's (dictionary path, resolve_affixes) -> WordCache, in
+# word_caches.
+_THREAD_STATE = local()
+
+
+def check_poem(raw_poem: str, poetry_forms: POETRY_FORMS,
+               word_to_phonemes: PRONOUNCING_DICTIONARY,
+               word_cache: Optional[WordCache] = None,
+               matchers: Optional[List[FormMatcher]] = None,
+               with_diagnostics: bool = True) -> Tuple[
+                   List[str], List[LINE_DIAGNOSTIC]]:
+    """Return the names of the forms in poetry_forms that raw_poem matches,
+    in the order of poetry_forms, and a diagnostic for each line of the
+    cleaned poem, or no diagnostics if with_diagnostics is False. Lines
+    holding only whitespace are not part of the poem. Words missing from
+    word_to_phonemes are reported in the diagnostics, and a poem with any of
+    them matches no form. Words are looked up through word_cache, which must
+    be over word_to_phonemes, if it is given. matchers, if given, must be
+    compile_poetry_forms(poetry_forms).
+
+    Forms are matched with early exit, so without diagnostics only as many
+    lines are looked at as it takes to rule each form in or out.
+
+    >>> word_to_phonemes = {'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}
+    >>> forms = {'Couplet': ([1, 1], ['A', 'A']), 'Pair': ([1, 1], ['*', '*'])}
+    >>> check_poem('In\\n\\nsin!', forms, word_to_phonemes)
+    (['Couplet', 'Pair'], [(1, 'A', []), (1, 'A', [])])
+    >>> check_poem('In\\n   \\nsin!', forms, word_to_phonemes)[0]
+    ['Couplet', 'Pair']
+    >>> check_poem('To sin\\nin vain', forms, word_to_phonemes)
+    ([], [(2, 'A', []), (1, '', ['VAIN'])])
+    >>> check_poem('In\\nsin', forms, word_to_phonemes, with_diagnostics=False)
+    (['Couplet', 'Pair'], [])
+    """
+
+    if word_cache is None:
+        word_cache = WordCache(word_to_phonemes)
+    if matchers is None:
+        matchers = compile_poetry_forms(poetry_forms)
+    # Lines holding only whitespace are dropped, as the poem readers do.
+    token_lines = [line.split() for line in raw_poem.split('\n')
+                   if line.strip()]
+    lines = PoemLines(token_lines, word_cache)
+    matched_forms = match_poetry_forms(token_lines, matchers, word_cache,
+                                       lines)
+    if not with_diagnostics:
+        return matched_forms, []
+
+    # Lines the matchers already looked at are not looked up again.
+    line_numbers = range(len(lines))
+    rhyme_scheme = label_rhyme_endings(
+        [lines.ending(line_number) for line_number in line_numbers])
+    return matched_forms, [
+        (lines.known_syllables(line_number), rhyme_scheme[line_number],
+         lines.unknown_words(line_number)) for line_number in line_numbers]
+
+
+def check_poems(poems: Iterable[Tuple[object, str]], poetry_forms: POETRY_FORMS,
+                dictionary_path: str, executor: Optional[Executor] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                max_pending: int = DEFAULT_MAX_PENDING,
+                resolve_affixes: bool = False,
+                with_diagnostics: bool = True) -> Iterator[POEM_CHECK]:
+    """Yield (poem id, matched forms, diagnostics) for each (poem id, raw
+    poem) in poems, in order, as check_poem would give them using the
+    pronouncing dictionary at dictionary_path. If resolve_affixes is True,
+    words missing from the dictionary are taken apart by an AffixResolver
+    and only the words it cannot resolve are reported. If with_diagnostics
+    is False, no diagnostics are made, and each poem is looked at only as
+    far as matching the forms needs.
+
+    The poems are checked on executor in chunks of chunk_size. Each worker
+    process loads the dictionary once, on its first chunk, and each worker
+    thread keeps a WordCache over it across chunks. poems is
+    read only as far as max_pending chunks ahead of the results yielded, so
+    it may be a stream of any length. If executor is None, a
+    ProcessPoolExecutor is created for the call.
+
+    >>> import os, tempfile
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> from poetry_reader import SAMPLE_DICTIONARY_FILE
+    >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.txt')
+    >>> with open(path, 'w') as pronunciation_file:
+    ...     _ = pronunciation_file.write(SAMPLE_DICTIONARY_FILE)
+    >>> poems = enumerate(['Heart of absinthe', 'Fonder\\nheart', 'Fonder heart'])
+    >>> forms = {'Single': ([3], ['A'])}
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     for result in check_poems(poems, forms, path, executor, 2, 1):
+    ...         print(result)
+    (0, [], [(3, 'A', ['OF'])])
+    (1, [], [(2, 'A', []), (1, 'B', [])])
+    (2, ['Single'], [(3, 'A', [])])
+    >>> with ThreadPoolExecutor(2) as executor:
+    ...     list(check_poems([(0, 'Fonder hearts')], forms, path, executor, resolve_affixes=True))
+    [(0, ['Single'], [(3, 'A', [])])]
+
+    Precondition: chunk_size > 0, max_pending > 0
+    """
+
+    if executor is None:
+        with ProcessPoolExecutor() as own_executor:
+            yield from check_poems(poems, poetry_forms, dictionary_path,
+                                   own_executor, chunk_size, max_pending,
+                                   resolve_affixes, with_diagnostics)
+        return
+
+    poems = iter(poems)
+    pending = deque()
+    while True:
+        chunk = list(islice(poems, chunk_size))
+        if chunk:
+            pending.append(executor.submit(_check_chunk, chunk, poetry_forms,
+                                           dictionary_path, resolve_affixes,
+                                           with_diagnostics))
+        if pending and (not chunk or len(pending) >= max_pending):
+            yield from pending.popleft().result()
+        elif not chunk:
+            return
+
+
+def _check_chunk(chunk: List[Tuple[object, str]], poetry_forms: POETRY_FORMS,
+                 dictionary_path: str, resolve_affixes: bool,
+                 with_diagnostics: bool) -> List[POEM_CHECK]:
+    """Return the result of checking each (poem id, raw poem) in chunk
+    against poetry_forms, using the pronouncing dictionary at
+    dictionary_path and, if resolve_affixes is True, an AffixResolver.
+    Diagnostics are made only if with_diagnostics is True.
+    """
+
+    word_to_phonemes = _DICTIONARIES.get(dictionary_path)
+    if word_to_phonemes is None:
+        word_to_phonemes = load_pronouncing_dictionary(dictionary_path)
+        _DICTIONARIES[dictionary_path] = word_to_phonemes
+    word_caches = getattr(_THREAD_STATE, 'word_caches', None)
+    if word_caches is None:
+        word_caches = _THREAD_STATE.word_caches = {}
+    word_cache = word_caches.get((dictionary_path, resolve_affixes))
+    if word_cache is None:
+        resolver = AffixResolver(word_to_phonemes) if resolve_affixes \
+            else None
+        word_cache = WordCache(word_to_phonemes, resolver=resolver)
+        word_caches[(dictionary_path, resolve_affixes)] = word_cache
+    matchers = compile_poetry_forms(poetry_forms)
+    result = []
+    for poem_id, raw_poem in chunk:
+        matched_forms, diagnostics = check_poem(
+            raw_poem, poetry_forms, word_to_phonemes, word_cache, matchers,
+            with_diagnostics)
+        result.append((poem_id, matched_forms, diagnostics))
+    return result
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,116 @@
+"""A bounded cache of what the Poetry Checker works out for each word
+"""
+
+from collections import OrderedDict
+from typing import Optional
+from typing import Tuple
+
+from poetry_affixes import AffixResolver
+from poetry_constants import PRONOUNCING_DICTIONARY, WORD_PHONEMES
+from poetry_functions import clean_word
+from poetry_phonemes import count_syllables, rhyme_ending
+
+# The most tokens a WordCache holds by default.
+DEFAULT_MAX_SIZE = 1 << 16
+
+# What a WordCache keeps for a raw token: (cleaned word, phonemes or None if
+# the word is not in the dictionary, number of syllables, rhyme ending or ''
+# if the word has no vowel or is not in the dictionary).
+WORD_ENTRY = Tuple[str, Optional[WORD_PHONEMES], int, str]
+
+
+class WordCache:
+    """A least-recently-used cache from raw tokens of poems to their cleaned
+    word, phonemes, syllable count and rhyme ending, looked up in a
+    pronouncing dictionary. Words missing from the dictionary are given to
+    an AffixResolver, if the cache has one.
+
+    hits, misses and evictions count the lookups found in the cache, the
+    lookups that were not, and the entries dropped to stay within max_size.
+    A WordCache is not safe to share between threads.
+    """
+
+    def __init__(self, word_to_phonemes: PRONOUNCING_DICTIONARY,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 resolver: Optional[AffixResolver] = None) -> None:
+        """Initialize an empty cache of at most max_size tokens over the
+        pronouncing dictionary word_to_phonemes, falling back on resolver
+        for missing words if it is not None.
+
+        >>> cache = WordCache({'NO': ['N', 'OW1']}, 10)
+        >>> cache.max_size, cache.hits, cache.misses, cache.evictions
+        (10, 0, 0, 0)
+        >>> WordCache({'NO': ['N', 'OW1']}, 10, AffixResolver({'NO': ['N', 'OW1']})).lookup("no's")
+        ("NO'S", ['N', 'OW1', 'Z'], 1, 'OWZ')
+
+        Precondition: max_size > 0
+        """
+
+        self.word_to_phonemes = word_to_phonemes
+        self.max_size = max_size
+        self.resolver = resolver
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of tokens in this cache.
+        """
+
+        return len(self._entries)
+
+    def lookup(self, token: str) -> WORD_ENTRY:
+        """Return (cleaned word, phonemes, syllables, rhyme ending) for the
+        raw token token, working it out only if token is not in this cache.
+
+        >>> cache = WordCache({'NO': ['N', 'OW1'], 'SIN': ['S', 'IH0', 'N']}, 2)
+        >>> cache.lookup('No!')
+        ('NO', ['N', 'OW1'], 1, 'OW')
+        >>> cache.lookup('sin,')
+        ('SIN', ['S', 'IH0', 'N'], 1, 'IHN')
+        >>> cache.lookup('No!')[0], cache.lookup('yes')
+        ('NO', ('YES', None, 0, ''))
+        >>> cache.hits, cache.misses, cache.evictions, len(cache)
+        (1, 3, 1, 2)
+        """
+
+        entries = self._entries
+        entry = entries.get(token)
+        if entry is not None:
+            self.hits += 1
+            entries.move_to_end(token)
+            return entry
+        self.misses += 1
+        word = clean_word(token)
+        phonemes = self.word_to_phonemes.get(word)
+        if phonemes is None and self.resolver is not None:
+            phonemes = self.resolver.resolve(word)
+        if phonemes is None:
+            entry = (word, None, 0, '')
+        else:
+            syllables = count_syllables(phonemes)
+            entry = (word, phonemes, syllables,
+                     rhyme_ending(phonemes) if syllables else '')
+        entries[token] = entry
+        if len(entries) > self.max_size:
+            entries.popitem(False)
+            self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        """Remove every token from this cache. The counters are kept.
+
+        >>> cache = WordCache({'NO': ['N', 'OW1']})
+        >>> _ = cache.lookup('no')
+        >>> cache.clear()
+        >>> len(cache), cache.misses
+        (0, 1)
+        """
+
+        self._entries.clear()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -46,6 +46,16 @@ For example:
 """
 WORD_PHONEMES = List[str]
 
+"""
+The compact pronunciation for a single word: bytes (or an array('B')) with
+one code per phoneme, as made by poetry_phonemes.encode_phonemes. A code
+holds both the phoneme and, for a vowel, its stress level.
+
+For example, for ['G', 'UW1', 'F', 'IY0']:
+bytes([80, 58, 76, 41])
+"""
+COMPACT_PHONEMES = bytes
+
 """
 The pronunciation for a line of poetry: a list of word pronunciations.
 
@@ -77,3 +87,18 @@ For example, here is a (small) pronunciation dictionary:
  'GOOFY': ['G', 'UW1', 'F', 'IY0']}
 """
 PRONOUNCING_DICTIONARY = Dict[str, WORD_PHONEMES]
+
+"""
+What checking found for one line of a poem: a three-item tuple of
+(int, str, List[str])
+  - first item is the number of syllables in the line
+  - second item is the line's rhyme letter in the poem's rhyme scheme, or
+    '' if the line's rhyme could not be found
+  - third item is the words on the line that are not in the pronouncing
+    dictionary; if there are any, the syllables are only those of the
+    other words
+
+For example, for the line "Hickory dickory dock":
+(6, 'A', ['DICKORY'])
+"""
+LINE_DIAGNOSTIC = Tuple[int, str, List[str]]
@@ -0,0 +1,340 @@
+"""A compiled, memory-mapped form of the pronouncing dictionary
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from collections.abc import Sequence
+from types import TracebackType
+from typing import BinaryIO
+from typing import Iterator
+from typing import Optional
+from typing import TextIO
+from typing import Type
+
+from poetry_constants import PRONOUNCING_DICTIONARY, WORD_PHONEMES
+from poetry_reader import read_pronouncing_dictionary
+
+# A compiled dictionary file is the magic bytes, the number of words, the
+# number of distinct phonemes and the byte sizes of the name, word and
+# phoneme id sections, followed by:
+#   - the phoneme names, sorted, each followed by a newline, in UTF-8;
+#   - the words, sorted and concatenated, in UTF-8, whose byte order is the
+#     order in which Python sorts strings;
+#   - word count + 1 little-endian uint32 offsets into the words: word i is
+#     bytes offsets[i] to offsets[i + 1];
+#   - word count + 1 little-endian uint32 offsets into the phoneme ids, laid
+#     out the same way;
+#   - the phoneme ids, one byte each, indexing the phoneme names.
+_MAGIC = b'PDX1'
+_HEADER = struct.Struct('<4sIHIII')
+
+
+def compile_pronouncing_dictionary(pronunciation_file: TextIO,
+                                   compiled_file: BinaryIO) -> int:
+    """Read pronunciation_file, which is in the format of the CMU Pronouncing
+    Dictionary, write its compiled form to the binary file compiled_file and
+    return the number of words written.
+
+    >>> import io
+    >>> from poetry_reader import SAMPLE_DICTIONARY_FILE
+    >>> compiled_file = io.BytesIO()
+    >>> compile_pronouncing_dictionary(io.StringIO(SAMPLE_DICTIONARY_FILE), compiled_file)
+    3
+
+    Words need not be ASCII; they are stored in UTF-8.
+
+    Precondition: pronunciation_file is in the format that
+    read_pronouncing_dictionary accepts, with fewer than 256 distinct
+    phonemes
+    """
+
+    dictionary = read_pronouncing_dictionary(pronunciation_file)
+    words = sorted(dictionary)
+    names = sorted({phoneme for phonemes in dictionary.values()
+                    for phoneme in phonemes})
+    phoneme_ids = {name: index for index, name in enumerate(names)}
+
+    word_blob = bytearray()
+    word_offsets = array('I', [0])
+    phoneme_blob = bytearray()
+    phoneme_offsets = array('I', [0])
+    for word in words:
+        word_blob.extend(word.encode('utf-8'))
+        word_offsets.append(len(word_blob))
+        phoneme_blob.extend(phoneme_ids[name] for name in dictionary[word])
+        phoneme_offsets.append(len(phoneme_blob))
+    if sys.byteorder == 'big':
+        word_offsets.byteswap()
+        phoneme_offsets.byteswap()
+
+    name_blob = ''.join(name + '\n' for name in names).encode('utf-8')
+    compiled_file.write(_HEADER.pack(
+        _MAGIC, len(words), len(names), len(name_blob), len(word_blob),
+        len(phoneme_blob)))
+    compiled_file.write(name_blob)
+    compiled_file.write(word_blob)
+    compiled_file.write(word_offsets.tobytes())
+    compiled_file.write(phoneme_offsets.tobytes())
+    compiled_file.write(phoneme_blob)
+    return len(words)
+
+
+class CompiledPronouncingDictionary(Mapping):
+    """A read-only pronouncing dictionary backed by a memory-mapped compiled
+    dictionary file.
+
+    Words are found by binary search over the sorted words, and only the
+    phonemes of the words looked up are turned into strings. The file is
+    mapped read-only, so worker processes forked after it is opened share
+    one copy of it. close, or leaving a with block, unmaps it.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize a dictionary over the compiled dictionary file at path.
+
+        >>> import io, os, tempfile
+        >>> from poetry_reader import SAMPLE_DICTIONARY_FILE, EXPECTED_DICTIONARY
+        >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.pdx')
+        >>> with open(path, 'wb') as compiled_file:
+        ...     compile_pronouncing_dictionary(io.StringIO(SAMPLE_DICTIONARY_FILE), compiled_file)
+        3
+        >>> dictionary = CompiledPronouncingDictionary(path)
+        >>> dictionary == EXPECTED_DICTIONARY
+        True
+        >>> dictionary['HEART']
+        ['HH', 'AA1', 'R', 'T']
+        >>> dictionary.close()
+
+        Precondition: path names a file written by
+        compile_pronouncing_dictionary
+        """
+
+        with open(path, 'rb') as compiled_file:
+            self._map = mmap.mmap(compiled_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, count, _, name_size, word_size, phoneme_size = \
+            _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError('not a compiled pronouncing dictionary: ' + path)
+        view = self._view = memoryview(self._map)
+        start = _HEADER.size
+        self._names = bytes(view[start:start + name_size]).decode(
+            'utf-8').split('\n')[:-1]
+        start += name_size
+        self._word_start = start
+        start += word_size
+        self._word_offsets = _offsets(view[start:start + 4 * (count + 1)])
+        start += 4 * (count + 1)
+        self._phoneme_offsets = _offsets(view[start:start + 4 * (count + 1)])
+        start += 4 * (count + 1)
+        self._phonemes = view[start:start + phoneme_size]
+        self._count = count
+
+    def close(self) -> None:
+        """Unmap the compiled dictionary file. This dictionary cannot be used
+        afterwards.
+
+        >>> import io, os, tempfile
+        >>> from poetry_reader import SAMPLE_DICTIONARY_FILE
+        >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.pdx')
+        >>> with open(path, 'wb') as compiled_file:
+        ...     compile_pronouncing_dictionary(io.StringIO(SAMPLE_DICTIONARY_FILE), compiled_file)
+        3
+        >>> with CompiledPronouncingDictionary(path) as dictionary:
+        ...     len(dictionary)
+        3
+        >>> dictionary._map.closed
+        True
+        """
+
+        if self._map.closed:
+            return
+        # Every view into the map must be released before it can be closed.
+        for view in (self._word_offsets, self._phoneme_offsets,
+                     self._phonemes, self._view):
+            view.release()
+        self._map.close()
+
+    def __enter__(self) -> 'CompiledPronouncingDictionary':
+        """Return this dictionary, to be closed at the end of a with block.
+        """
+
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        """Close this dictionary.
+        """
+
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of words in this dictionary.
+        """
+
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield the words in this dictionary in sorted order.
+        """
+
+        for index in range(self._count):
+            yield self.word(index)
+
+    def __contains__(self, word: object) -> bool:
+        """Return True if and only if word is in this dictionary.
+        """
+
+        return isinstance(word, str) and self.find(word) >= 0
+
+    def __getitem__(self, word: str) -> WORD_PHONEMES:
+        """Return the phonemes of word, raising KeyError if word is not in
+        this dictionary.
+        """
+
+        index = self.find(word) if isinstance(word, str) else -1
+        if index < 0:
+            raise KeyError(word)
+        return self.phoneme_ids_to_names(self.phoneme_ids(index))
+
+    def find(self, word: str) -> int:
+        """Return the index of word in the sorted words of this dictionary,
+        or -1 if it is not there.
+        """
+
+        try:
+            key = word.encode('utf-8')
+        except UnicodeEncodeError:
+            return -1
+        mapped = self._map
+        start = self._word_start
+        offsets = self._word_offsets
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if mapped[start + offsets[middle]:
+                      start + offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and \
+           mapped[start + offsets[low]:start + offsets[low + 1]] == key:
+            return low
+        return -1
+
+    def word(self, index: int) -> str:
+        """Return the word at index in the sorted words of this dictionary.
+
+        Precondition: 0 <= index < len(self)
+        """
+
+        offsets = self._word_offsets
+        start = self._word_start
+        return self._map[start + offsets[index]:
+                         start + offsets[index + 1]].decode('utf-8')
+
+    def sorted_words(self) -> 'SortedWords':
+        """Return the words of this dictionary in sorted order, as a sequence
+        that decodes only the words it is asked for.
+
+        >>> import io, os, tempfile
+        >>> from poetry_reader import SAMPLE_DICTIONARY_FILE
+        >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.pdx')
+        >>> with open(path, 'wb') as compiled_file:
+        ...     compile_pronouncing_dictionary(io.StringIO(SAMPLE_DICTIONARY_FILE), compiled_file)
+        3
+        >>> with CompiledPronouncingDictionary(path) as dictionary:
+        ...     words = dictionary.sorted_words()
+        ...     len(words), words[1], words[-1], list(words) == sorted(dictionary)
+        (3, 'FONDER', 'HEART', True)
+        """
+
+        return SortedWords(self)
+
+    def phoneme_ids(self, index: int) -> bytes:
+        """Return the phoneme ids of the word at index, one byte each.
+        """
+
+        offsets = self._phoneme_offsets
+        return bytes(self._phonemes[offsets[index]:offsets[index + 1]])
+
+    def phoneme_ids_to_names(self, phoneme_ids: bytes) -> WORD_PHONEMES:
+        """Return the phoneme names for phoneme_ids.
+        """
+
+        names = self._names
+        return [names[phoneme_id] for phoneme_id in phoneme_ids]
+
+
+class SortedWords(Sequence):
+    """The words of a CompiledPronouncingDictionary in sorted order, each
+    decoded from the file only when it is asked for.
+    """
+
+    def __init__(self, dictionary: CompiledPronouncingDictionary) -> None:
+        """Initialize the sorted words of dictionary.
+        """
+
+        self.dictionary = dictionary
+
+    def __len__(self) -> int:
+        """Return the number of words.
+        """
+
+        return len(self.dictionary)
+
+    def __getitem__(self, index: int) -> str:
+        """Return the word at index, which may be negative.
+        """
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('word index out of range')
+        return self.dictionary.word(index)
+
+
+def _offsets(view: memoryview) -> memoryview:
+    """Return the little-endian uint32 offsets in view as a sequence of ints.
+    """
+
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    offsets = array('I', view)
+    offsets.byteswap()
+    return memoryview(offsets)
+
+
+def load_pronouncing_dictionary(path: str) -> PRONOUNCING_DICTIONARY:
+    """Return the pronouncing dictionary in the file at path, for use
+    wherever a PRONOUNCING_DICTIONARY is expected. A compiled dictionary file
+    is memory-mapped; a file in the format of the CMU Pronouncing Dictionary
+    is read with its syllable counts and rhyme endings precomputed.
+
+    >>> import os, tempfile
+    >>> from poetry_reader import SAMPLE_DICTIONARY_FILE, EXPECTED_DICTIONARY
+    >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.txt')
+    >>> with open(path, 'w') as pronunciation_file:
+    ...     _ = pronunciation_file.write(SAMPLE_DICTIONARY_FILE)
+    >>> load_pronouncing_dictionary(path) == EXPECTED_DICTIONARY
+    True
+    """
+
+    with open(path, 'rb') as dictionary_file:
+        magic = dictionary_file.read(len(_MAGIC))
+    if magic == _MAGIC:
+        return CompiledPronouncingDictionary(path)
+    with open(path) as pronunciation_file:
+        return read_pronouncing_dictionary(pronunciation_file, True)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
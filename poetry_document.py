@@ -0,0 +1,239 @@
+"""A poem being edited, re-checked line by line as it changes
+"""
+
+from typing import List
+from typing import Tuple
+
+from poetry_cache import WordCache
+from poetry_constants import (
+    CLEAN_POEM, LINE_DIAGNOSTIC, LINE_PRONUNCIATION, POEM_PRONUNCIATION)
+from poetry_forms import FormMatcher
+from poetry_functions import label_rhyme_endings
+
+# What a PoemDocument keeps for one line: (cleaned words, phonemes of the
+# words that are in the dictionary, number of syllables in those words,
+# rhyme ending or '', words not in the dictionary).
+_LINE_INFO = Tuple[List[str], LINE_PRONUNCIATION, int, str, List[str]]
+
+
+class PoemDocument:
+    """The lines of a poem under edit, each with its words, phonemes,
+    syllable count and rhyme ending worked out when the line is added or
+    changed and kept until it changes again.
+
+    Edits give line numbers among all lines, counting from 0, including
+    empty ones. Everything the document reports is about the lines of the
+    poem as clean_poem gives them, which leaves out empty lines. Like
+    PoemLines, a PoemDocument has a length and syllables and ending methods
+    over those lines, so a FormMatcher can check it directly.
+    """
+
+    def __init__(self, word_cache: WordCache, text: str = '') -> None:
+        """Initialize a document holding text, looking words up through
+        word_cache.
+
+        >>> cache = WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N']})
+        >>> document = PoemDocument(cache, 'In\\n\\nsin')
+        >>> document.lines, len(document)
+        (['In', '', 'sin'], 2)
+        """
+
+        self.word_cache = word_cache
+        self.lines = []
+        self._infos = []
+        # Caches of what is worked out from all the lines, None when an edit
+        # has made them stale.
+        self._poem_line_numbers = None
+        self._rhyme_scheme = None
+        if text:
+            for line in text.split('\n'):
+                self.insert_line(len(self.lines), line)
+
+    def insert_line(self, line_number: int, line: str) -> None:
+        """Insert line before line line_number, or at the end if line_number
+        is the number of lines.
+
+        >>> document = PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'In')
+        >>> document.insert_line(0, 'to')
+        >>> document.get_rhyme_scheme()
+        ['A', 'B']
+
+        Precondition: 0 <= line_number <= len(self.lines)
+        """
+
+        self.lines.insert(line_number, line)
+        self._infos.insert(line_number, self._analyze(line))
+        self._poem_line_numbers = None
+        self._rhyme_scheme = None
+
+    def replace_line(self, line_number: int, line: str) -> None:
+        """Replace line line_number with line.
+
+        >>> document = PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'In\\nto')
+        >>> document.replace_line(1, 'sin')
+        >>> document.get_rhyme_scheme()
+        ['A', 'A']
+
+        Precondition: 0 <= line_number < len(self.lines)
+        """
+
+        old_info = self._infos[line_number]
+        new_info = self._analyze(line)
+        if bool(line) != bool(self.lines[line_number]):
+            self._poem_line_numbers = None
+            self._rhyme_scheme = None
+        elif new_info[3] != old_info[3]:
+            self._rhyme_scheme = None
+        self.lines[line_number] = line
+        self._infos[line_number] = new_info
+
+    def delete_line(self, line_number: int) -> None:
+        """Remove line line_number.
+
+        >>> document = PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'to\\nIn\\nsin')
+        >>> document.delete_line(0)
+        >>> document.lines, document.get_rhyme_scheme()
+        (['In', 'sin'], ['A', 'A'])
+
+        Precondition: 0 <= line_number < len(self.lines)
+        """
+
+        del self.lines[line_number]
+        del self._infos[line_number]
+        self._poem_line_numbers = None
+        self._rhyme_scheme = None
+
+    def _analyze(self, line: str) -> _LINE_INFO:
+        """Return what this document keeps for line.
+        """
+
+        words = []
+        phonemes = []
+        syllables = 0
+        unknown_words = []
+        entry = None
+        for token in line.split():
+            entry = self.word_cache.lookup(token)
+            words.append(entry[0])
+            if entry[1] is None:
+                unknown_words.append(entry[0])
+            else:
+                phonemes.append(entry[1])
+                syllables += entry[2]
+        ending = entry[3] if entry is not None else ''
+        return words, phonemes, syllables, ending, unknown_words
+
+    def _get_poem_line_numbers(self) -> List[int]:
+        """Return the line numbers of the lines that are in the poem.
+        """
+
+        if self._poem_line_numbers is None:
+            self._poem_line_numbers = [
+                line_number for line_number, line in enumerate(self.lines)
+                if line]
+        return self._poem_line_numbers
+
+    def __len__(self) -> int:
+        """Return the number of lines in the poem.
+        """
+
+        return len(self._get_poem_line_numbers())
+
+    def syllables(self, poem_line: int) -> int:
+        """Return the number of syllables on line poem_line of the poem, or
+        -1 if a word on it is not in the dictionary.
+
+        >>> document = PoemDocument(WordCache({'IN': ['IH0', 'N'], 'TO': ['T', 'UW1']}), '\\nto in\\nin vain')
+        >>> document.syllables(0), document.syllables(1)
+        (2, -1)
+        """
+
+        info = self._infos[self._get_poem_line_numbers()[poem_line]]
+        return -1 if info[4] else info[2]
+
+    def ending(self, poem_line: int) -> str:
+        """Return the rhyme ending of line poem_line of the poem, or '' if
+        its last word is not in the dictionary or has no vowel.
+        """
+
+        return self._infos[self._get_poem_line_numbers()[poem_line]][3]
+
+    def get_cleaned_poem(self) -> CLEAN_POEM:
+        """Return the poem as clean_poem would give it.
+
+        >>> PoemDocument(WordCache({}), 'In, sin!\\n\\nTo').get_cleaned_poem()
+        [['IN', 'SIN'], ['TO']]
+        """
+
+        return [self._infos[line_number][0]
+                for line_number in self._get_poem_line_numbers()]
+
+    def get_pronunciation(self) -> POEM_PRONUNCIATION:
+        """Return the pronunciation of the poem, as extract_phonemes gives
+        it, leaving out words that are not in the dictionary.
+        """
+
+        return [self._infos[line_number][1]
+                for line_number in self._get_poem_line_numbers()]
+
+    def get_num_syllables(self) -> List[int]:
+        """Return the number of syllables on each line of the poem, counting
+        only the words that are in the dictionary.
+
+        >>> PoemDocument(WordCache({'IN': ['IH0', 'N'], 'TO': ['T', 'UW1']}), 'to in\\n\\nin vain').get_num_syllables()
+        [2, 1]
+        """
+
+        return [self._infos[line_number][2]
+                for line_number in self._get_poem_line_numbers()]
+
+    def get_rhyme_scheme(self) -> List[str]:
+        """Return the rhyme letter of each line of the poem, labelled as
+        get_rhyme_scheme labels them, with '' for lines that cannot rhyme.
+        Only the kept rhyme endings are looked at, and only after an edit
+        that changed them.
+
+        >>> PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'in\\nto\\nvain\\nsin').get_rhyme_scheme()
+        ['A', 'B', '', 'A']
+        """
+
+        if self._rhyme_scheme is None:
+            self._rhyme_scheme = label_rhyme_endings(
+                [self._infos[line_number][3]
+                 for line_number in self._get_poem_line_numbers()])
+        return self._rhyme_scheme[:]
+
+    def get_diagnostics(self) -> List[LINE_DIAGNOSTIC]:
+        """Return a diagnostic for each line of the poem, as check_poem
+        gives them.
+
+        >>> PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'To sin\\nin vain').get_diagnostics()
+        [(2, 'A', []), (1, '', ['VAIN'])]
+        """
+
+        rhyme_scheme = self.get_rhyme_scheme()
+        return [(info[2], label, info[4]) for info, label in zip(
+            (self._infos[line_number]
+             for line_number in self._get_poem_line_numbers()),
+            rhyme_scheme)]
+
+    def match_forms(self, matchers: List[FormMatcher]) -> List[str]:
+        """Return the names of the matchers in matchers whose forms the poem
+        has, in order.
+
+        >>> from poetry_forms import compile_poetry_forms
+        >>> matchers = compile_poetry_forms({'Couplet': ([1, 1], ['A', 'A'])})
+        >>> document = PoemDocument(WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}), 'In\\nto')
+        >>> document.match_forms(matchers)
+        []
+        >>> document.replace_line(1, 'sin')
+        >>> document.match_forms(matchers)
+        ['Couplet']
+        """
+
+        return [matcher.name for matcher in matchers if matcher.matches(self)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,202 @@
+"""Poetry forms compiled into matchers that stop at the first mismatch
+"""
+
+from typing import List
+from typing import Optional
+
+from poetry_cache import WordCache
+from poetry_constants import CLEAN_POEM, POETRY_FORM, POETRY_FORMS
+
+
+class PoemLines:
+    """The lines of a cleaned poem, whose syllable counts and rhyme endings
+    are worked out only when first asked for and then kept, so that every
+    matcher checking the poem shares them.
+    """
+
+    def __init__(self, cleaned_poem: CLEAN_POEM,
+                 word_cache: WordCache) -> None:
+        """Initialize the lines of cleaned_poem, looking words up through
+        word_cache.
+
+        >>> lines = PoemLines([['IN'], ['SIN']], WordCache({}))
+        >>> len(lines)
+        2
+        """
+
+        self.cleaned_poem = cleaned_poem
+        self.word_cache = word_cache
+        self._syllables = [None] * len(cleaned_poem)
+        self._unknown_words = [None] * len(cleaned_poem)
+        self._endings = [None] * len(cleaned_poem)
+
+    def __len__(self) -> int:
+        """Return the number of lines in the poem.
+        """
+
+        return len(self.cleaned_poem)
+
+    def syllables(self, line_number: int) -> int:
+        """Return the number of syllables on line line_number, counting from
+        0, or -1 if a word on it is not in the dictionary.
+
+        >>> lines = PoemLines([['TO', 'SIN'], ['IN', 'VAIN']], WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}))
+        >>> lines.syllables(0), lines.syllables(1)
+        (2, -1)
+        """
+
+        if self.unknown_words(line_number):
+            return -1
+        return self._syllables[line_number]
+
+    def known_syllables(self, line_number: int) -> int:
+        """Return the number of syllables in the words on line line_number,
+        counting from 0, that are in the dictionary.
+
+        >>> lines = PoemLines([['TO', 'SIN'], ['IN', 'VAIN']], WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}))
+        >>> lines.known_syllables(0), lines.known_syllables(1)
+        (2, 1)
+        """
+
+        if self._syllables[line_number] is None:
+            self._look_up_line(line_number)
+        return self._syllables[line_number]
+
+    def unknown_words(self, line_number: int) -> List[str]:
+        """Return the cleaned words on line line_number, counting from 0,
+        that are not in the dictionary, in order.
+
+        >>> lines = PoemLines([['TO', 'SIN'], ['IN', 'vain!']], WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}))
+        >>> lines.unknown_words(0), lines.unknown_words(1)
+        ([], ['VAIN'])
+        """
+
+        if self._unknown_words[line_number] is None:
+            self._look_up_line(line_number)
+        return self._unknown_words[line_number]
+
+    def _look_up_line(self, line_number: int) -> None:
+        """Look up every word on line line_number and keep its syllable count
+        and unknown words.
+        """
+
+        syllables = 0
+        unknown_words = []
+        lookup = self.word_cache.lookup
+        for word in self.cleaned_poem[line_number]:
+            entry = lookup(word)
+            if entry[1] is None:
+                unknown_words.append(entry[0])
+            else:
+                syllables += entry[2]
+        self._syllables[line_number] = syllables
+        self._unknown_words[line_number] = unknown_words
+
+    def ending(self, line_number: int) -> str:
+        """Return the rhyme ending of line line_number, counting from 0, or
+        '' if its last word is not in the dictionary or has no vowel.
+
+        >>> lines = PoemLines([['TO', 'SIN'], ['IN', 'VAIN']], WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']}))
+        >>> lines.ending(0), lines.ending(1)
+        ('IHN', '')
+        """
+
+        ending = self._endings[line_number]
+        if ending is None:
+            line = self.cleaned_poem[line_number]
+            ending = self.word_cache.lookup(line[-1])[3] if line else ''
+            self._endings[line_number] = ending
+        return ending
+
+
+class FormMatcher:
+    """A poetry form prepared for checking poems against: the poem's line
+    count is checked first, then its syllables line by line, then its
+    rhymes line by line, stopping at the first line that does not fit.
+
+    A poem fits the form if it has as many lines as the form, each line has
+    the syllables the form gives it, and lines rhyme exactly when the form
+    gives them the same rhyme letter. A '*' line may rhyme with any line or
+    none.
+    """
+
+    def __init__(self, name: str, poetry_form: POETRY_FORM) -> None:
+        """Initialize a matcher for the form poetry_form called name.
+
+        >>> matcher = FormMatcher('Limerick', ([8, 8, 5, 5, 8], ['A', 'A', 'B', 'B', 'A']))
+        >>> matcher.line_count, matcher.rhyme_lines
+        (5, ((0, 'A'), (1, 'A'), (2, 'B'), (3, 'B'), (4, 'A')))
+        """
+
+        self.name = name
+        self.syllables = tuple(poetry_form[0])
+        self.line_count = len(self.syllables)
+        # (line number, rhyme letter) for every line that must rhyme or must
+        # not rhyme with others.
+        self.rhyme_lines = tuple(
+            (line_number, letter)
+            for line_number, letter in enumerate(poetry_form[1])
+            if letter != '*')
+
+    def matches(self, lines: PoemLines) -> bool:
+        """Return True if and only if the poem lines has this form.
+
+        >>> cache = WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']})
+        >>> FormMatcher('Couplet', ([1, 1], ['A', 'A'])).matches(PoemLines([['IN'], ['SIN']], cache))
+        True
+        >>> FormMatcher('Pair', ([1, 1], ['A', 'B'])).matches(PoemLines([['IN'], ['SIN']], cache))
+        False
+        """
+
+        if len(lines) != self.line_count:
+            return False
+        for line_number, syllables in enumerate(self.syllables):
+            if lines.syllables(line_number) != syllables:
+                return False
+        letter_to_ending = {}
+        ending_to_letter = {}
+        for line_number, letter in self.rhyme_lines:
+            ending = lines.ending(line_number)
+            if not ending or \
+               letter_to_ending.setdefault(letter, ending) != ending or \
+               ending_to_letter.setdefault(ending, letter) != letter:
+                return False
+        return True
+
+
+def compile_poetry_forms(poetry_forms: POETRY_FORMS) -> List[FormMatcher]:
+    """Return a matcher for each form in poetry_forms, in order.
+
+    >>> [matcher.name for matcher in compile_poetry_forms({'Haiku': ([5, 7, 5], ['*', '*', '*']), 'Couplet': ([1, 1], ['A', 'A'])})]
+    ['Haiku', 'Couplet']
+    """
+
+    return [FormMatcher(name, poetry_form)
+            for name, poetry_form in poetry_forms.items()]
+
+
+def match_poetry_forms(cleaned_poem: CLEAN_POEM, matchers: List[FormMatcher],
+                       word_cache: WordCache,
+                       lines: Optional[PoemLines] = None) -> List[str]:
+    """Return the names of the matchers in matchers whose forms cleaned_poem
+    has, in order, looking words up through word_cache. Each line's syllables
+    and rhyme ending are worked out at most once, and only if some matcher
+    gets as far as that line. lines may be given to share them with other
+    calls for the same poem.
+
+    >>> cache = WordCache({'IN': ['IH0', 'N'], 'SIN': ['S', 'IH0', 'N'], 'TO': ['T', 'UW1']})
+    >>> matchers = compile_poetry_forms({'Couplet': ([1, 1], ['A', 'A']), 'Pair': ([1, 1], ['*', '*']), 'Single': ([2], ['A'])})
+    >>> match_poetry_forms([['IN'], ['SIN']], matchers, cache)
+    ['Couplet', 'Pair']
+    >>> match_poetry_forms([['TO', 'SIN']], matchers, cache)
+    ['Single']
+    """
+
+    if lines is None:
+        lines = PoemLines(cleaned_poem, word_cache)
+    return [matcher.name for matcher in matchers if matcher.matches(lines)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
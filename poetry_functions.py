@@ -2,12 +2,21 @@
 """
 
 from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import Dict
+from typing import TYPE_CHECKING
 
 from poetry_constants import (
     CLEAN_POEM, WORD_PHONEMES, LINE_PRONUNCIATION, POEM_PRONUNCIATION,
     PRONOUNCING_DICTIONARY)
+from poetry_phonemes import (
+    count_syllables, decode_phonemes, is_compact, rhyme_ending)
+from text_normalize import WORD_PUNCTUATION, normalize_poem
+
+if TYPE_CHECKING:
+    # poetry_cache uses clean_word, so it can only be imported for checking.
+    from poetry_cache import WordCache
 
 # ===================== Helper Functions =====================
 
@@ -26,8 +35,7 @@ def clean_word(s: str) -> str:
     'QUOTED'
     """
 
-    punctuation = """!"'`@$%^&_-+={}|\\/,;:.-?)([]<>*#\n\t\r """
-    result = s.upper().strip(punctuation)
+    result = s.upper().strip(WORD_PUNCTUATION)
     return result
 
 
@@ -77,9 +85,12 @@ def break_apart_by_space(non_empty_lines: List[str]) -> List[List[str]]:
         lists_of_words.append(list_of_words.split())
     return lists_of_words
 
-def clean_poem(raw_poem: str) -> CLEAN_POEM:
+def clean_poem(raw_poem: str,
+               word_cache: Optional['WordCache'] = None) -> CLEAN_POEM:
     r"""Return the non-blank, non-empty lines of poem, with whitespace removed
-    from the beginning and end of each line and all words capitalized.
+    from the beginning and end of each line and all words capitalized. If
+    word_cache is given, each word is cleaned through it, so a word seen
+    before is not cleaned again.
     
     Precondition: The raw poem has to have lines seperated by the newline character.
     
@@ -87,29 +98,30 @@ def clean_poem(raw_poem: str) -> CLEAN_POEM:
     [['THE', 'FIRST', 'LINE', 'LEADS', 'OFF'], ['WITH', 'A', 'GAP', 'BEFORE', 'THE', 'NEXT'], ['THEN', 'THE', 'POEM', 'ENDS']]
     >>> clean_poem('I am Fred.\nI am twelve years old.\n\nSincerely,\n\nFred')
     [['I', 'AM', 'FRED'], ['I', 'AM', 'TWELVE', 'YEARS', 'OLD'], ['SINCERELY'], ['FRED']]
+    >>> from poetry_cache import WordCache
+    >>> clean_poem('I am Fred.\n\nFred', WordCache({}))
+    [['I', 'AM', 'FRED'], ['FRED']]
     """
     
-    list_of_lines = split_by_newline(raw_poem)
-    list_of_non_empty_lines = remove_empty_lines(list_of_lines)
-    lists_of_words = break_apart_by_space(list_of_non_empty_lines)
-    cleaned_list_of_words = []
-    for word_list in lists_of_words:
-        cleaned_word_list = []
-        for word in word_list:
-            cleaned_word_list.append(clean_word(word))
-        cleaned_list_of_words.append(cleaned_word_list)
-    return cleaned_list_of_words
+    if word_cache is None:
+        return normalize_poem(raw_poem)
+    lookup = word_cache.lookup
+    return [[lookup(token)[0] for token in line.split()]
+            for line in raw_poem.split('\n') if line]
 
 
 def extract_phonemes(
         cleaned_poem: CLEAN_POEM,
-        word_to_phonemes: PRONOUNCING_DICTIONARY) -> POEM_PRONUNCIATION:
+        word_to_phonemes: PRONOUNCING_DICTIONARY,
+        word_cache: Optional['WordCache'] = None) -> POEM_PRONUNCIATION:
     r"""Return a list where each inner list contains the phonemes for the
     corresponding line of cleaned_poem, based on the word_to_phonemes
-    pronouncing dictionary.
+    pronouncing dictionary. If word_cache is given, which must be over
+    word_to_phonemes, words are looked up through it, and through its
+    AffixResolver if it has one.
 
     Precondition: Each word in the cleaned poem is a key in the word to 
-    phoneme dictionary.
+    phoneme dictionary, or can be resolved by word_cache.
     
     >>> word_to_phonemes = {'YES': ['Y', 'EH1', 'S'], 'NO': ['N', 'OW1']}
     >>> extract_phonemes([['YES'], ['NO', 'YES']], word_to_phonemes)
@@ -117,8 +129,13 @@ def extract_phonemes(
     >>> word_to_phonemes = {'HI': ['HH', 'AY1'], 'BYE': ['B', 'AY1']}
     >>> extract_phonemes([['HI'], ['HI', 'BYE']], word_to_phonemes)
     [[['HH', 'AY1']], [['HH', 'AY1'], ['B', 'AY1']]]
+    >>> from poetry_cache import WordCache
+    >>> extract_phonemes([['HI'], ['BYE']], word_to_phonemes, WordCache(word_to_phonemes))
+    [[['HH', 'AY1']], [['B', 'AY1']]]
     """
     
+    if word_cache is not None:
+        return _extract_cached_phonemes(cleaned_poem, word_cache)
     poem_of_phonemes = []
     for line in cleaned_poem:
         line_of_phonemes = []
@@ -127,10 +144,30 @@ def extract_phonemes(
         poem_of_phonemes.append(line_of_phonemes)
     return poem_of_phonemes
 
+def _extract_cached_phonemes(cleaned_poem: CLEAN_POEM,
+                             word_cache: 'WordCache') -> POEM_PRONUNCIATION:
+    r"""Return the pronunciation of cleaned_poem, looking each word up
+    through word_cache. Raise KeyError for a word that word_cache cannot
+    find.
+    """
+
+    lookup = word_cache.lookup
+    poem_of_phonemes = []
+    for line in cleaned_poem:
+        line_of_phonemes = []
+        for word in line:
+            phonemes = lookup(word)[1]
+            if phonemes is None:
+                raise KeyError(word)
+            line_of_phonemes.append(phonemes)
+        poem_of_phonemes.append(line_of_phonemes)
+    return poem_of_phonemes
+
 def phonemes_to_str(poem_pronunciation: POEM_PRONUNCIATION) -> str:
     r"""Return a string containing all the phonemes in each word in each line in
     poem_pronunciation. The phonemes are separated by spaces, the words are
-    separated by ' | ', and the lines are separated by '\\n'.
+    separated by ' | ', and the lines are separated by '\\n'. Words may be in
+    compact form.
 
     Precondition: There is at least one word/phoneme/line in poem pronunciation list.
     
@@ -144,6 +181,8 @@ def phonemes_to_str(poem_pronunciation: POEM_PRONUNCIATION) -> str:
     for line in poem_pronunciation:
         list_of_words = []
         for word in line:
+            if is_compact(word):
+                word = decode_phonemes(word)
             word_joined = " ".join(word)
             list_of_words.append(word_joined)
         one_line = " | ".join(list_of_words)
@@ -154,6 +193,7 @@ def get_common_last_syllables(
         poem_pronunciation: POEM_PRONUNCIATION) -> Dict[str, List[int]]:
     r"""Return a dictionary of syllables as the keys with values as a list of all 
     the line numbers that share that common syllable as the last syllable.
+    Words may be in compact form or precomputed.
     
     Precondition: There is at least one line/word/phoneme in poem_pronunciation.
     
@@ -166,26 +206,37 @@ def get_common_last_syllables(
     line_number = 0
     syllables_to_rhyme = {}
     for line in poem_pronunciation:
-        syllable_counter = -1
-        last_syllable = line[-1][syllable_counter]
-        while not last_syllable[-1] in '1234567890':
-            syllable_counter -= 1
-            last_syllable = line[-1][syllable_counter]
         line_number += 1
-        if syllable_counter != -1:
-            ending_phoneme = last_syllable[:-1] + line[-1][-1]
-        else:
-            ending_phoneme = last_syllable[:-1]
+        ending_phoneme = rhyme_ending(line[-1])
         if not ending_phoneme in syllables_to_rhyme:
             syllables_to_rhyme[ending_phoneme] = [line_number]
         else:
             syllables_to_rhyme[ending_phoneme].append(line_number)    
     return syllables_to_rhyme    
 
+def get_rhyme_label(index: int) -> str:
+    r"""Return the rhyme letter for the rhyme numbered index from 0: 'A' to
+    'Z' for the first 26, then 'AA', 'AB', and so on, as spreadsheet columns
+    are named.
+
+    >>> [get_rhyme_label(i) for i in (0, 1, 25)]
+    ['A', 'B', 'Z']
+    >>> [get_rhyme_label(i) for i in (26, 27, 51, 52, 701, 702)]
+    ['AA', 'AB', 'AZ', 'BA', 'ZZ', 'AAA']
+    """
+
+    label = ''
+    index += 1
+    while index > 0:
+        index, letter = divmod(index - 1, 26)
+        label = chr(ord('A') + letter) + label
+    return label
+
 def get_common_rhymes(
         common_syllables: Dict[str, List[int]]) -> Dict[str, List[int]]:
     r"""Return a dictionary with rhyme letters corresponding to different syllables
     as keys and the values are all the lines with that common rhyme letter.
+    After 'Z', rhyme letters go on as get_rhyme_label gives them.
     
     Precondition: There is at least one syllable in common_syllables with at least
     one line with that syllable.
@@ -197,43 +248,53 @@ def get_common_rhymes(
     """
     
     rhymes_and_lines = {}
-    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    syllables = []
-    for key in common_syllables:
-        syllables.append(key)  
-    for i in range(len(syllables)):
-        rhymes_and_lines[alphabet[i]] = common_syllables[syllables[i]]
+    for i, syllable in enumerate(common_syllables):
+        rhymes_and_lines[get_rhyme_label(i)] = common_syllables[syllable]
     return rhymes_and_lines
         
 def get_rhyme_scheme(poem_pronunciation: POEM_PRONUNCIATION) -> List[str]:
     r"""Return a list of last syllables from the poem described by
-    poem_pronunction.
+    poem_pronunction. Lines are labelled in one pass: each new rhyme ending
+    gets the next rhyme letter, as get_common_rhymes gives them. A line that
+    is empty or whose last word has no vowel, such as a word that could not
+    be resolved, gets '' instead.
 
-    Precondition: poem_pronunciation is not empty and each PHONEMES list
-    contains at least one vowel phoneme.
+    Precondition: poem_pronunciation is not empty.
 
     >>> get_rhyme_scheme([[['IH0', 'N']], [['S', 'IH0', 'N']]])
     ['A', 'A']
     >>> get_rhyme_scheme([[['IH0', 'N']], [['S', 'IH0', 'N']], [['T','AH0']], [['H', 'AH0']]])
     ['A', 'A', 'B', 'B']
+    >>> get_rhyme_scheme([[['IH0', 'N']], [['N', 'OW1'], []], [], [['S', 'IH0', 'N']]])
+    ['A', '', '', 'A']
     """
     
-    rhymes_with_lines = get_common_rhymes(
-        get_common_last_syllables(poem_pronunciation))
-    rhyme_letter_keys = []
+    return label_rhyme_endings(
+        [rhyme_ending(line[-1]) if line and count_syllables(line[-1]) else ''
+         for line in poem_pronunciation])
+
+def label_rhyme_endings(endings: List[str]) -> List[str]:
+    r"""Return the rhyme letter of each rhyme ending in endings, as
+    get_rhyme_scheme labels them: each new ending gets the next rhyme letter,
+    and '' stands for a line that cannot rhyme and gets ''.
+
+    >>> label_rhyme_endings(['IHN', 'AH', '', 'IHN'])
+    ['A', 'B', '', 'A']
+    """
+
+    ending_to_label = {'': ''}
     output = []
-    for key in rhymes_with_lines:
-        rhyme_letter_keys.append(key)
-    for i in range(len(poem_pronunciation)):
-        for key in rhyme_letter_keys:
-            for line in rhymes_with_lines[key]:
-                if (i + 1) == line:
-                    output.append(key)
+    for ending in endings:
+        label = ending_to_label.get(ending)
+        if label is None:
+            label = get_rhyme_label(len(ending_to_label) - 1)
+            ending_to_label[ending] = label
+        output.append(label)
     return output
 
 def get_num_syllables(poem_pronunciation: POEM_PRONUNCIATION) -> List[int]:
     r"""Return a list of the number of syllables in each poem_pronunciation
-    line.
+    line. Words may be in compact form or precomputed.
     
     Precondition: poem_ponunciation has at least one phoneme which is a syllable.
     
@@ -247,9 +308,7 @@ def get_num_syllables(poem_pronunciation: POEM_PRONUNCIATION) -> List[int]:
     for line in poem_pronunciation:
         number_of_syllables = 0
         for word in line:
-            for phoneme in word:
-                if phoneme[-1] in '0123456789':
-                    number_of_syllables += 1
+            number_of_syllables += count_syllables(word)
         syllables_for_lines.append(number_of_syllables)
     return syllables_for_lines
 
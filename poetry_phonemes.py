@@ -0,0 +1,210 @@
+"""A compact form of pronunciations: one byte per phoneme
+"""
+
+from typing import Dict
+
+from poetry_constants import (
+    COMPACT_PHONEMES, WORD_PHONEMES, PRONOUNCING_DICTIONARY)
+
+# The phonemes of the CMU Pronouncing Dictionary, vowels first. A phoneme's
+# code is its index here times STRESS_LEVELS, plus 1 + its stress level if
+# it is a vowel, so a code is a vowel exactly when its low bits are not 0.
+ARPABET = (
+    'AA', 'AE', 'AH', 'AO', 'AW', 'AY', 'EH', 'ER', 'EY', 'IH', 'IY', 'OW',
+    'OY', 'UH', 'UW',
+    'B', 'CH', 'D', 'DH', 'F', 'G', 'HH', 'JH', 'K', 'L', 'M', 'N', 'NG',
+    'P', 'R', 'S', 'SH', 'T', 'TH', 'V', 'W', 'Y', 'Z', 'ZH')
+VOWEL_COUNT = 15
+STRESS_LEVELS = 4
+
+# Phoneme name -> code, and code -> phoneme name ('' for unused codes).
+_CODES = {}
+_NAMES = [''] * 256
+for _index, _name in enumerate(ARPABET):
+    if _index < VOWEL_COUNT:
+        for _stress in range(STRESS_LEVELS - 1):
+            _CODES[_name + str(_stress)] = \
+                _index * STRESS_LEVELS + 1 + _stress
+    else:
+        _CODES[_name] = _index * STRESS_LEVELS
+for _name, _code in _CODES.items():
+    _NAMES[_code] = _name
+
+# Translates each code to 1 if it is a vowel and 0 otherwise.
+_VOWEL_FLAGS = bytes(1 if code % STRESS_LEVELS else 0 for code in range(256))
+
+
+def encode_phonemes(phonemes: WORD_PHONEMES) -> COMPACT_PHONEMES:
+    """Return the compact form of the phonemes of a word.
+
+    >>> list(encode_phonemes(['HH', 'AA1', 'R', 'T']))
+    [84, 2, 116, 128]
+    >>> list(encode_phonemes(['Y', 'EH1', 'S']))
+    [144, 26, 120]
+
+    Precondition: every phoneme is an ARPAbet phoneme, with a stress level
+    from 0 to 2 if it is a vowel
+    """
+
+    try:
+        return bytes([_CODES[phoneme] for phoneme in phonemes])
+    except KeyError as error:
+        raise ValueError('unknown phoneme: ' + str(error)) from None
+
+
+def decode_phonemes(codes: COMPACT_PHONEMES) -> WORD_PHONEMES:
+    """Return the phonemes of a word from their compact form codes.
+
+    >>> decode_phonemes(bytes([84, 2, 116, 128]))
+    ['HH', 'AA1', 'R', 'T']
+    >>> decode_phonemes(encode_phonemes(['Y', 'EH1', 'S']))
+    ['Y', 'EH1', 'S']
+    """
+
+    return [_NAMES[code] for code in codes]
+
+
+def encode_dictionary(
+        word_to_phonemes: PRONOUNCING_DICTIONARY) -> Dict[str,
+                                                          COMPACT_PHONEMES]:
+    """Return a pronouncing dictionary like word_to_phonemes, with the
+    phonemes of each word in compact form.
+
+    >>> encode_dictionary({'NO': ['N', 'OW1']})
+    {'NO': b'h.'}
+    >>> decode_phonemes(encode_dictionary({'HI': ['HH', 'AY1']})['HI'])
+    ['HH', 'AY1']
+    """
+
+    return {word: encode_phonemes(phonemes)
+            for word, phonemes in word_to_phonemes.items()}
+
+
+def is_compact(phonemes: object) -> bool:
+    """Return True if and only if phonemes is the phonemes of a word in
+    compact form rather than a list of strings.
+
+    >>> is_compact(b'h.')
+    True
+    >>> is_compact(['N', 'OW1'])
+    False
+    """
+
+    return not isinstance(phonemes, list) and \
+        not (phonemes and isinstance(phonemes[0], str))
+
+
+def count_vowels(codes: COMPACT_PHONEMES) -> int:
+    """Return the number of vowels, and so of syllables, in the compact form
+    codes.
+
+    >>> count_vowels(encode_phonemes(['T', 'AH0', 'M', 'EY1', 'T', 'OW2']))
+    3
+    >>> count_vowels(b'')
+    0
+    """
+
+    return bytes(codes).translate(_VOWEL_FLAGS).count(1)
+
+
+def count_syllables(phonemes: WORD_PHONEMES) -> int:
+    """Return the number of syllables in the phonemes of a word, which may
+    be in compact form or precomputed.
+
+    >>> count_syllables(['T', 'AH0', 'M', 'EY1', 'T', 'OW2'])
+    3
+    >>> count_syllables(encode_phonemes(['N', 'OW1']))
+    1
+    """
+
+    if isinstance(phonemes, PrecomputedPhonemes):
+        return phonemes.syllable_count
+    if is_compact(phonemes):
+        return count_vowels(phonemes)
+    number_of_syllables = 0
+    for phoneme in phonemes:
+        if phoneme[-1] in '0123456789':
+            number_of_syllables += 1
+    return number_of_syllables
+
+
+def rhyme_ending(phonemes: WORD_PHONEMES) -> str:
+    """Return the ending get_common_last_syllables uses to match rhymes for
+    the phonemes of a word, which may be in compact form or precomputed: the
+    last vowel without its stress, followed by the last phoneme if that is
+    not the vowel.
+
+    >>> rhyme_ending(['S', 'T', 'AA1', 'R', 'T', 'S'])
+    'AAS'
+    >>> rhyme_ending(encode_phonemes(['B', 'AY1']))
+    'AY'
+
+    Precondition: phonemes contains at least one vowel
+    """
+
+    if isinstance(phonemes, PrecomputedPhonemes) and \
+       phonemes.rhyme_ending is not None:
+        return phonemes.rhyme_ending
+    if is_compact(phonemes):
+        index = len(phonemes) - 1
+        while not phonemes[index] % STRESS_LEVELS:
+            index -= 1
+        ending = ARPABET[phonemes[index] // STRESS_LEVELS]
+        if index != len(phonemes) - 1:
+            ending += _NAMES[phonemes[-1]]
+        return ending
+    syllable_counter = -1
+    last_syllable = phonemes[syllable_counter]
+    while not last_syllable[-1] in '1234567890':
+        syllable_counter -= 1
+        last_syllable = phonemes[syllable_counter]
+    if syllable_counter != -1:
+        return last_syllable[:-1] + phonemes[-1]
+    return last_syllable[:-1]
+
+
+class PrecomputedPhonemes(list):
+    """The phonemes of a word, as a list, together with the word's syllable
+    count and rhyme ending, so that they are worked out once per word rather
+    than once per use.
+
+    The list must not be changed after it is made, since the precomputed
+    values would no longer match it.
+    """
+
+    __slots__ = ('syllable_count', 'rhyme_ending')
+
+    def __init__(self, phonemes: WORD_PHONEMES) -> None:
+        """Initialize the precomputed form of phonemes. rhyme_ending is None
+        if phonemes has no vowel.
+
+        >>> phonemes = PrecomputedPhonemes(['S', 'IH0', 'N'])
+        >>> phonemes, phonemes.syllable_count, phonemes.rhyme_ending
+        (['S', 'IH0', 'N'], 1, 'IHN')
+        >>> PrecomputedPhonemes(['HH', 'M']).rhyme_ending is None
+        True
+        """
+
+        super().__init__(phonemes)
+        self.syllable_count = count_syllables(phonemes)
+        self.rhyme_ending = rhyme_ending(phonemes) \
+            if self.syllable_count else None
+
+
+def precompute_dictionary(
+        word_to_phonemes: PRONOUNCING_DICTIONARY) -> PRONOUNCING_DICTIONARY:
+    """Return a pronouncing dictionary like word_to_phonemes, with the
+    phonemes of each word precomputed.
+
+    >>> dictionary = precompute_dictionary({'NO': ['N', 'OW1']})
+    >>> dictionary['NO'], dictionary['NO'].syllable_count
+    (['N', 'OW1'], 1)
+    """
+
+    return {word: PrecomputedPhonemes(phonemes)
+            for word, phonemes in word_to_phonemes.items()}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
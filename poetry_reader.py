@@ -1,13 +1,18 @@
 """Functions for reading the pronouncing dictionary and the poetry forms files
 """
+import os
 from typing import TextIO
+from typing import Iterator
 from typing import List
+from typing import Optional
 from typing import Tuple
 
 
+from poetry_phonemes import PrecomputedPhonemes
 from poetry_constants import (
-    # CLEAN_POEM, WORD_PHONEMES, LINE_PRONUNCIATION, POEM_PRONUNCIATION,
-    PRONOUNCING_DICTIONARY, POETRY_FORM, POETRY_FORMS)
+    # WORD_PHONEMES, LINE_PRONUNCIATION, POEM_PRONUNCIATION,
+    CLEAN_POEM, PRONOUNCING_DICTIONARY, POETRY_FORM, POETRY_FORMS)
+from text_normalize import normalize_poem
 
 SAMPLE_POETRY_FORM_FILE = '''Limerick
 8 A
@@ -80,6 +85,15 @@ SAMPLE_POEM_FILE_2 = ''' Hey you my name is Joe.
 I heard my name on the radio.
 '''
 
+SAMPLE_CORPUS_FILE = '''  Is this mic on?
+
+Get off my lawn.
+%
+%
+ Hey you my name is Joe.
+I heard my name on the radio.
+'''
+
 def read_and_trim_whitespace(poem_file: TextIO) -> str:
     """Return a string containing the poem in poem_file, with
     blank lines and leading and trailing whitespace removed.
@@ -96,17 +110,78 @@ def read_and_trim_whitespace(poem_file: TextIO) -> str:
     'Hey you my name is Joe.\\nI heard my name on the radio.'
     """
     
-    poem = ""
-    for line in poem_file.readlines():
-        if line != "\n":
-            poem += line.strip() + "\n"
-    return poem.strip()
+    return "\n".join(line.strip() for line in poem_file
+                     if line != "\n").strip()
+
+
+def read_poems(poem_file: TextIO,
+               delimiter: Optional[str] = None) -> Iterator[CLEAN_POEM]:
+    """Yield the poems in poem_file one at a time, each cleaned as
+    clean_poem cleans it. Poems are separated by lines that are delimiter
+    once stripped of whitespace; if delimiter is None, the whole file is one
+    poem. Lines holding only whitespace are dropped, as
+    read_and_trim_whitespace drops them, and poems with no words are
+    skipped. Only one poem is held in memory
+    at a time.
+
+    >>> import io
+    >>> for poem in read_poems(io.StringIO(SAMPLE_CORPUS_FILE), '%'):
+    ...     print(poem)
+    [['IS', 'THIS', 'MIC', 'ON'], ['GET', 'OFF', 'MY', 'LAWN']]
+    [['HEY', 'YOU', 'MY', 'NAME', 'IS', 'JOE'], ['I', 'HEARD', 'MY', 'NAME', 'ON', 'THE', 'RADIO']]
+    >>> list(read_poems(io.StringIO(SAMPLE_POEM_FILE)))
+    [[['IS', 'THIS', 'MIC', 'ON'], ['GET', 'OFF', 'MY', 'LAWN']]]
+    >>> list(read_poems(io.StringIO('Roses red\\n   \\nViolets blue\\n')))
+    [[['ROSES', 'RED'], ['VIOLETS', 'BLUE']]]
+    """
+
+    lines = []
+    for line in poem_file:
+        if delimiter is not None and line.strip() == delimiter:
+            poem = normalize_poem(''.join(lines))
+            lines = []
+            if any(poem):
+                yield poem
+        elif line.strip():
+            lines.append(line)
+    poem = normalize_poem(''.join(lines))
+    if any(poem):
+        yield poem
+
+
+def read_poem_corpus(path: str,
+                     delimiter: Optional[str] = None) -> Iterator[CLEAN_POEM]:
+    """Yield the poems in the file at path, or in each file directly in the
+    directory at path in order of file name, as read_poems reads them.
+
+    >>> import os, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> with open(os.path.join(directory, 'b.txt'), 'w') as poem_file:
+    ...     _ = poem_file.write(SAMPLE_POEM_FILE_2)
+    >>> with open(os.path.join(directory, 'a.txt'), 'w') as poem_file:
+    ...     _ = poem_file.write(SAMPLE_CORPUS_FILE)
+    >>> [poem[0][0] for poem in read_poem_corpus(directory, '%')]
+    ['IS', 'HEY', 'HEY']
+    """
+
+    if not os.path.isdir(path):
+        with open(path) as poem_file:
+            yield from read_poems(poem_file, delimiter)
+        return
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            with open(file_path) as poem_file:
+                yield from read_poems(poem_file, delimiter)
 
 
 def read_pronouncing_dictionary(
-        pronunciation_file: TextIO) -> PRONOUNCING_DICTIONARY:
+        pronunciation_file: TextIO,
+        precompute: bool = False) -> PRONOUNCING_DICTIONARY:
     """Read pronunciation_file, which is in the format of the CMU Pronouncing
-    Dictionary, and return the pronunciation dictionary.
+    Dictionary, and return the pronunciation dictionary. If precompute is
+    True, the phonemes of each word are a PrecomputedPhonemes, which carries
+    the word's syllable count and rhyme ending.
     
     Precondition: The pronunciation file has the first line commented followed
     by every subsequent line starting with a capitalized word and followed by 
@@ -123,15 +198,20 @@ def read_pronouncing_dictionary(
     >>> result = read_pronouncing_dictionary(dict_file_2)
     >>> result == EXPECTED_DICTIONARY_2
     True
+    >>> result = read_pronouncing_dictionary(io.StringIO(SAMPLE_DICTIONARY_FILE), True)
+    >>> result == EXPECTED_DICTIONARY, result['FONDER'].syllable_count
+    (True, 2)
     """
     
     pronouncing_dictionary = {}
-    for line in pronunciation_file.readlines():
+    for line in pronunciation_file:
         if not ";;;" in line and not line in '\n':
             components = line.split()
-            first_element = components[0]
-            components.remove(first_element)
-            pronouncing_dictionary[first_element] = components
+            if precompute:
+                pronouncing_dictionary[components[0]] = \
+                    PrecomputedPhonemes(components[1:])
+            else:
+                pronouncing_dictionary[components[0]] = components[1:]
     return pronouncing_dictionary
 
 def read_poetry_form_descriptions(
@@ -0,0 +1,174 @@
+"""An index of the words of a pronouncing dictionary by how they rhyme
+"""
+
+import struct
+import sys
+from array import array
+from typing import BinaryIO
+from typing import List
+from typing import Optional
+
+from poetry_constants import PRONOUNCING_DICTIONARY
+from poetry_dictionary import CompiledPronouncingDictionary
+from poetry_phonemes import count_syllables, rhyme_ending
+
+# A rhyme index file is the magic bytes, the number of words in the
+# dictionary it was built from and the number of groups, followed by each
+# group: the length of its rhyme ending, its syllable count and its number
+# of words, then the ending in ASCII and the word ids as little-endian
+# uint32s.
+_MAGIC = b'RHX1'
+_HEADER = struct.Struct('<4sII')
+_GROUP_HEADER = struct.Struct('<BHI')
+
+
+class RhymeIndex:
+    """The words of a pronouncing dictionary grouped by rhyme ending, as
+    get_common_last_syllables finds it, and within that by syllable count.
+
+    A word's id is its position among the dictionary's words in sorted
+    order, so an index can be saved without the words and loaded again
+    alongside the same dictionary. A compiled dictionary keeps its words in
+    that order, so loading alongside one neither sorts nor decodes them.
+    """
+
+    def __init__(self, word_to_phonemes: PRONOUNCING_DICTIONARY) -> None:
+        """Initialize an index of the words in word_to_phonemes. Words with
+        no vowel are left out.
+
+        >>> index = RhymeIndex({'CAT': ['K', 'AE1', 'T'], 'HAT': ['HH', 'AE1', 'T'], 'SHH': ['SH']})
+        >>> index.words, index.groups
+        (['CAT', 'HAT', 'SHH'], {'AET': {1: array('I', [0, 1])}})
+        """
+
+        self.word_to_phonemes = word_to_phonemes
+        self.words = sorted(word_to_phonemes)
+        # Rhyme ending -> syllable count -> ids of the words, in order.
+        self.groups = {}
+        for word_id, word in enumerate(self.words):
+            phonemes = word_to_phonemes[word]
+            syllables = count_syllables(phonemes)
+            if syllables:
+                by_syllables = self.groups.setdefault(rhyme_ending(phonemes),
+                                                      {})
+                word_ids = by_syllables.get(syllables)
+                if word_ids is None:
+                    word_ids = by_syllables[syllables] = array('I')
+                word_ids.append(word_id)
+
+    def rhymes(self, word: str,
+               num_syllables: Optional[int] = None) -> List[str]:
+        """Return the other words in the dictionary that rhyme with word,
+        only those with num_syllables syllables if it is not None. Words are
+        in order of syllable count and then alphabetically.
+
+        >>> index = RhymeIndex({'CAT': ['K', 'AE1', 'T'], 'HAT': ['HH', 'AE1', 'T'], 'COMBAT': ['K', 'AA1', 'M', 'B', 'AE0', 'T'], 'DOG': ['D', 'AO1', 'G']})
+        >>> index.rhymes('CAT')
+        ['HAT', 'COMBAT']
+        >>> index.rhymes('CAT', 2), index.rhymes('DOG')
+        (['COMBAT'], [])
+
+        Precondition: word is in the dictionary
+        """
+
+        phonemes = self.word_to_phonemes[word]
+        if not count_syllables(phonemes):
+            return []
+        by_syllables = self.groups.get(rhyme_ending(phonemes), {})
+        if num_syllables is None:
+            syllable_counts = sorted(by_syllables)
+        else:
+            syllable_counts = [num_syllables]
+        words = self.words
+        result = []
+        for syllables in syllable_counts:
+            for word_id in by_syllables.get(syllables, ()):
+                if words[word_id] != word:
+                    result.append(words[word_id])
+        return result
+
+    def save(self, index_file: BinaryIO) -> None:
+        """Write this index to the binary file index_file.
+
+        >>> import io
+        >>> index = RhymeIndex({'CAT': ['K', 'AE1', 'T'], 'HAT': ['HH', 'AE1', 'T']})
+        >>> index_file = io.BytesIO()
+        >>> index.save(index_file)
+        >>> len(index_file.getvalue())
+        30
+        """
+
+        group_count = sum(map(len, self.groups.values()))
+        index_file.write(_HEADER.pack(_MAGIC, len(self.words), group_count))
+        for ending, by_syllables in self.groups.items():
+            encoded_ending = ending.encode('ascii')
+            for syllables, word_ids in by_syllables.items():
+                index_file.write(_GROUP_HEADER.pack(
+                    len(encoded_ending), syllables, len(word_ids)))
+                index_file.write(encoded_ending)
+                index_file.write(_little_endian(word_ids).tobytes())
+
+    @classmethod
+    def load(cls, index_file: BinaryIO,
+             word_to_phonemes: PRONOUNCING_DICTIONARY) -> 'RhymeIndex':
+        """Return the index in the binary file index_file, which was saved
+        from an index of word_to_phonemes.
+
+        >>> import io
+        >>> word_to_phonemes = {'CAT': ['K', 'AE1', 'T'], 'HAT': ['HH', 'AE1', 'T']}
+        >>> index_file = io.BytesIO()
+        >>> RhymeIndex(word_to_phonemes).save(index_file)
+        >>> _ = index_file.seek(0)
+        >>> RhymeIndex.load(index_file, word_to_phonemes).rhymes('HAT')
+        ['CAT']
+        >>> import os, tempfile
+        >>> from poetry_dictionary import compile_pronouncing_dictionary
+        >>> path = os.path.join(tempfile.mkdtemp(), 'dictionary.pdx')
+        >>> with open(path, 'wb') as compiled_file:
+        ...     compile_pronouncing_dictionary(io.StringIO('CAT  K AE1 T\\nHAT  HH AE1 T\\n'), compiled_file)
+        2
+        >>> _ = index_file.seek(0)
+        >>> with CompiledPronouncingDictionary(path) as dictionary:
+        ...     RhymeIndex.load(index_file, dictionary).rhymes('HAT')
+        ['CAT']
+        """
+
+        magic, word_count, group_count = _HEADER.unpack(
+            index_file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError('not a rhyme index file')
+        if word_count != len(word_to_phonemes):
+            raise ValueError('rhyme index was built from another dictionary')
+        index = cls.__new__(cls)
+        index.word_to_phonemes = word_to_phonemes
+        if isinstance(word_to_phonemes, CompiledPronouncingDictionary):
+            index.words = word_to_phonemes.sorted_words()
+        else:
+            index.words = sorted(word_to_phonemes)
+        index.groups = {}
+        for _ in range(group_count):
+            ending_length, syllables, count = _GROUP_HEADER.unpack(
+                index_file.read(_GROUP_HEADER.size))
+            ending = index_file.read(ending_length).decode('ascii')
+            word_ids = array('I')
+            word_ids.frombytes(index_file.read(4 * count))
+            index.groups.setdefault(ending, {})[syllables] = \
+                _little_endian(word_ids)
+        return index
+
+
+def _little_endian(word_ids: array) -> array:
+    """Return word_ids with its byte order swapped if this machine is big
+    endian, which converts between native and little-endian order.
+    """
+
+    if sys.byteorder == 'little':
+        return word_ids
+    swapped = array('I', word_ids)
+    swapped.byteswap()
+    return swapped
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,72 @@
+"""Text normalization shared by the cipher and the Poetry Checker
+"""
+
+from typing import Iterable
+from typing import List
+
+from poetry_constants import CLEAN_POEM
+
+# The characters stripped from both ends of every word of a poem.
+WORD_PUNCTUATION = """!"'`@$%^&_-+={}|\\/,;:.-?)([]<>*#\n\t\r """
+
+# Maps each ASCII letter to its uppercase form and deletes every other ASCII
+# character.
+_ASCII_LETTER_TABLE = {
+    code: ord(chr(code).upper()) if chr(code).isalpha() else None
+    for code in range(128)}
+
+
+def normalize_message(message: str) -> str:
+    """Return the letters of message in uppercase, with every other character
+    removed.
+
+    >>> normalize_message('Hello world!')
+    'HELLOWORLD'
+    >>> normalize_message("Python? It's my favourite language.")
+    'PYTHONITSMYFAVOURITELANGUAGE'
+    >>> normalize_message('Straße 88')
+    'STRASSE'
+    """
+
+    if message.isascii():
+        return message.translate(_ASCII_LETTER_TABLE)
+    return ''.join(filter(str.isalpha, message)).upper()
+
+
+def normalize_messages(messages: Iterable[str]) -> List[str]:
+    """Return normalize_message applied to each message in messages.
+
+    >>> normalize_messages(['a7b%c', 'd7e*f '])
+    ['ABC', 'DEF']
+    """
+
+    return [normalize_message(message) for message in messages]
+
+
+def normalize_poem(raw_poem: str) -> CLEAN_POEM:
+    r"""Return the words of each non-empty line of raw_poem in uppercase, with
+    WORD_PUNCTUATION stripped from both ends of every word.
+
+    >>> normalize_poem('The first line leads off,\n\n\nWith a gap before the next.\n    Then the poem ends.\n')
+    [['THE', 'FIRST', 'LINE', 'LEADS', 'OFF'], ['WITH', 'A', 'GAP', 'BEFORE', 'THE', 'NEXT'], ['THEN', 'THE', 'POEM', 'ENDS']]
+    >>> normalize_poem('I am Fred.\nI am twelve years old.\n\nSincerely,\n\nFred')
+    [['I', 'AM', 'FRED'], ['I', 'AM', 'TWELVE', 'YEARS', 'OLD'], ['SINCERELY'], ['FRED']]
+    """
+
+    return [[word.strip(WORD_PUNCTUATION) for word in line.split()]
+            for line in raw_poem.upper().split('\n') if line]
+
+
+def normalize_poems(raw_poems: Iterable[str]) -> List[CLEAN_POEM]:
+    r"""Return normalize_poem applied to each poem in raw_poems.
+
+    >>> normalize_poems(['Yes!\n\nNo, yes.', 'Hi'])
+    [[['YES'], ['NO', 'YES']], [['HI']]]
+    """
+
+    return [normalize_poem(raw_poem) for raw_poem in raw_poems]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()